@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Import-time benchmark of PyCORN, measured with python -X importtime
+
+Every case is a statement run --repeat times in a fresh interpreter. The import time of the modules it loads
+(beyond those of an empty interpreter) is summed up from the -X importtime output, the best run counts.
+Cases that must stay light also fail if they load one of the heavy modules (numpy, pandas, xmltodict, ...).
+The results are written to a JSON file, compare two of them with
+    python bench_import.py --compare results/import_old.json results/import_new.json
+
+Examples:
+    python bench_import.py
+    python bench_import.py --cases import_pycorn construct --repeat 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+bench_dir = Path(__file__).resolve().parent
+repo_dir = bench_dir.parent
+
+heavy_modules = ('numpy', 'pandas', 'xmltodict', 'matplotlib', 'xlsxwriter', 'pyarrow')
+
+# name: (statement, heavy modules it may load), {res}/{zip} are replaced by the paths of small synthetic files
+cases = {
+    'import_pycorn': ("import pycorn", ()),
+    'construct': ("from pycorn import PcRes3, PcUni6; PcRes3({res!r}); PcUni6({zip!r})", ()),
+    'cli_import': ("import pycorn.cli", ()),
+    'res3_load': ("from pycorn import PcRes3; PcRes3({res!r}).load()", ('numpy',)),
+    'uni6_load_all_xml': ("from pycorn import PcUni6; PcUni6({zip!r}).load_all_xml()", ('numpy',)),
+}
+
+
+def import_times(statement):
+    """
+    Run `statement` in a fresh interpreter with -X importtime
+
+    Returns
+    -------
+    times : dict, module name: own import time in microseconds
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(repo_dir), os.environ.get('PYTHONPATH')])))
+    # measure imports from cached bytecode, as in an installed package, not the compilation
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env, cwd=bench_dir,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{process.stderr}")
+    times = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(own)
+    return times
+
+
+def run_case(name, files, repeat, baseline):
+    """
+    Import time of one case, without the modules every interpreter imports
+
+    Returns
+    -------
+    result : dict
+    """
+    statement, allowed = cases[name]
+    statement = statement.format(**files)
+    totals = []
+    modules = set()
+    # the first run writes the bytecode of modules that have changed
+    import_times(statement)
+    for _ in range(repeat):
+        times = {module: own for module, own in import_times(statement).items() if module not in baseline}
+        totals.append(sum(times.values()) / 1e6)
+        modules |= set(times)
+    loaded = sorted(module for module in modules if module.split('.')[0] in heavy_modules)
+    not_allowed = sorted({module.split('.')[0] for module in loaded} - set(allowed))
+    return dict(case=name, times=totals, best=min(totals), modules=len(modules),
+                heavy_modules=sorted({module.split('.')[0] for module in loaded}), not_allowed=not_allowed)
+
+
+def run(case_names, repeat, print_log=True):
+    """
+    Run all cases
+
+    Returns
+    -------
+    results : dict with the environment ('meta') and a list of results per case ('results')
+    """
+    sys.path.insert(0, str(repo_dir))
+    from bench_pycorn import git_commit
+    from pycorn.synthetic import write_res3, write_uni6
+
+    meta = dict(commit=git_commit(), date=time.strftime('%Y-%m-%dT%H:%M:%S'), python=sys.version.split()[0])
+    baseline = set(import_times('pass'))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = dict(res=write_res3(os.path.join(tmp_dir, 'import.res'), n_points=100),
+                     zip=write_uni6(os.path.join(tmp_dir, 'import.zip'), n_points=100))
+        for name in case_names:
+            result = run_case(name, files, repeat, baseline)
+            results.append(result)
+            if print_log:
+                flag = f"  LOADS {', '.join(result['not_allowed'])}" if result['not_allowed'] else ''
+                print(f"{name:20s} {result['best'] * 1000:9.2f} ms {result['modules']:5d} modules "
+                      f"heavy: {', '.join(result['heavy_modules']) or '-'}{flag}")
+    return dict(meta=meta, results=results)
+
+
+def compare(old_file, new_file, threshold=0.2):
+    """
+    Print the change of the import times between two result files
+
+    Returns
+    -------
+    regressions : int, number of cases that are slower by more than `threshold` or load heavy modules
+    """
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    old_results = {r['case']: r for r in old['results']}
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    regressions = 0
+    for result in new['results']:
+        if result['case'] not in old_results:
+            continue
+        old_result = old_results[result['case']]
+        ratio = result['best'] / old_result['best']
+        flag = ''
+        if ratio > 1 + threshold or result['not_allowed']:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{result['case']:20s} {old_result['best'] * 1000:9.2f} ms -> {result['best'] * 1000:9.2f} ms  "
+              f"x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of PyCORN")
+    parser.add_argument('--cases', nargs='+', choices=list(cases), default=list(cases), metavar='CASE',
+                        help=f"Cases to run (default: all): {', '.join(cases)}")
+    parser.add_argument('--repeat', type=int, default=5, help="Interpreters started per case, the best one counts")
+    parser.add_argument('--output', default=None,
+                        help="Result file (default: results/import_<date>_<commit>.json next to this script)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two result files instead of running, exits with 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Slow-down counted as regression by --compare (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    results = run(args.cases, args.repeat)
+    output = args.output
+    if output is None:
+        commit = (results['meta']['commit'] or 'unknown').replace('+', '-dirty')
+        output = bench_dir / 'results' / f"import_{time.strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print("Results written to: " + str(output))
+    # heavy modules in a light case are a regression by themselves
+    sys.exit(1 if any(result['not_allowed'] for result in results['results']) else 0)
+
+
+if __name__ == '__main__':
+    main()
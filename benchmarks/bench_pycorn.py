@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for loading and exporting result files of different sizes
+
+Synthetic .res files and zip-bundles are generated with pycorn.synthetic (and kept in --data-dir),
+every case is timed --repeat times and run once more under tracemalloc for its peak memory.
+The results are written to a JSON file named after the date and the git commit, compare two of them with
+    python bench_pycorn.py --compare results/old.json results/new.json
+
+Examples:
+    python bench_pycorn.py
+    python bench_pycorn.py --points 1000 1000000 10000000 --curves 1 50 --cases res3_load uni6_load_all_xml
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pycorn import PcRes3, PcUni6
+from pycorn.export import write_csv, write_xlsx
+from pycorn.synthetic import uni6_curve_names, write_res3, write_uni6
+from pycorn.utils import import_xml_as_df
+
+bench_dir = Path(__file__).resolve().parent
+# import_xml_as_df() only picks up chromatograms with "Cond" and e.g. "Elution" in their name
+uni6_chromatogram = 'Cond Elution'
+
+
+def _load_res3(path):
+    data = PcRes3(str(path))
+    data.load()
+    return data
+
+
+def _load_uni6(path):
+    data = PcUni6(str(path))
+    data.load()
+    data.load_all_xml()
+    return data
+
+
+def _data_keys(n_curves):
+    # all curves, "UV" is expanded to the UV curves by import_xml_as_df()
+    return ["UV"] + [name for name, _, _ in uni6_curve_names(n_curves) if "UV" not in name]
+
+
+def _write_csv(data, out_dir):
+    return write_csv(data, os.path.join(out_dir, 'bench'))
+
+
+def _write_xlsx(data, out_dir):
+    return write_xlsx(data, os.path.join(out_dir, 'bench.xlsx'))
+
+
+# name: (file format, setup(path, n_curves) -> args, function(*args, out_dir))
+cases = {
+    'res3_load': ('res3', lambda path, n_curves: (path,), lambda path, out_dir: _load_res3(path)),
+    'uni6_load': ('uni6', lambda path, n_curves: (path,), lambda path, out_dir: PcUni6(str(path)).load()),
+    'uni6_load_all_xml': ('uni6', lambda path, n_curves: (path,), lambda path, out_dir: _load_uni6(path)),
+    'import_xml_as_df': ('uni6', lambda path, n_curves: (path, _data_keys(n_curves)),
+                         lambda path, keys, out_dir: import_xml_as_df(str(path), list(keys))),
+    'res3_write_csv': ('res3', lambda path, n_curves: (_load_res3(path),), _write_csv),
+    'uni6_write_csv': ('uni6', lambda path, n_curves: (_load_uni6(path),), _write_csv),
+    'res3_write_xlsx': ('res3', lambda path, n_curves: (_load_res3(path),), _write_xlsx),
+    'uni6_write_xlsx': ('uni6', lambda path, n_curves: (_load_uni6(path),), _write_xlsx),
+}
+
+
+def data_file(data_dir, file_format, n_points, n_curves, seed=0):
+    """
+    Path of a synthetic file, generated if it does not exist yet
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    suffix = '.res' if file_format == 'res3' else '.zip'
+    path = data_dir / f"{file_format}_{n_points}p_{n_curves}c_s{seed}{suffix}"
+    if not path.exists():
+        tmp_path = path.with_suffix('.tmp')
+        if file_format == 'res3':
+            write_res3(tmp_path, n_points, n_curves, seed=seed)
+        else:
+            write_uni6(tmp_path, n_points, n_curves, chromatograms=(uni6_chromatogram,), seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run_case(name, path, n_points, n_curves, repeat):
+    """
+    Time one case and measure its peak memory
+
+    Returns
+    -------
+    result : dict
+    """
+    file_format, setup, function = cases[name]
+    args = setup(path, n_curves)
+    times = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            function(*args, out_dir)
+            times.append(time.perf_counter() - start)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function(*args, out_dir)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    best = min(times)
+    file_bytes = os.path.getsize(path)
+    return dict(case=name, format=file_format, points=n_points, curves=n_curves, file_bytes=file_bytes,
+                times=times, best=best, median=float(np.median(times)),
+                points_per_s=n_points * n_curves / best, mb_per_s=file_bytes / best / 2 ** 20, peak_bytes=peak)
+
+
+def git_commit():
+    """
+    Short hash of the checked out commit, with '+' if there are uncommitted changes, or None
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=bench_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+' if dirty else '')
+
+
+def run(case_names, points, curves, repeat, data_dir, print_log=True):
+    """
+    Run all combinations of cases, points and curves
+
+    Returns
+    -------
+    results : dict with the environment ('meta') and a list of results per case ('results')
+    """
+    meta = dict(commit=git_commit(), date=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                numpy=np.__version__, platform=platform.platform(), machine=platform.machine())
+    results = []
+    for n_points in points:
+        for n_curves in curves:
+            for name in case_names:
+                file_format = cases[name][0]
+                if 'xlsx' in name and n_points + 2 > 1048576:
+                    if print_log:
+                        print(f"skipped {name}: {n_points} points do not fit into a xlsx sheet")
+                    continue
+                path = data_file(data_dir, file_format, n_points, n_curves)
+                result = run_case(name, path, n_points, n_curves, repeat)
+                results.append(result)
+                if print_log:
+                    print(f"{name:20s} {n_points:>10d} points {n_curves:>3d} curves  {result['best']:9.4f} s "
+                          f"{result['points_per_s'] / 1e6:9.2f} Mpoints/s {result['mb_per_s']:9.1f} MB/s "
+                          f"peak {result['peak_bytes'] / 2 ** 20:9.1f} MB")
+    return dict(meta=meta, results=results)
+
+
+def compare(old_file, new_file, threshold=0.1):
+    """
+    Print the change of the best times between two result files
+
+    Returns
+    -------
+    regressions : int, number of cases that are slower by more than `threshold`
+    """
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    old_results = {(r['case'], r['points'], r['curves']): r for r in old['results']}
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    regressions = 0
+    for result in new['results']:
+        key = (result['case'], result['points'], result['curves'])
+        if key not in old_results:
+            continue
+        ratio = result['best'] / old_results[key]['best']
+        memory_ratio = result['peak_bytes'] / max(old_results[key]['peak_bytes'], 1)
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{key[0]:20s} {key[1]:>10d} points {key[2]:>3d} curves  {old_results[key]['best']:9.4f} s -> "
+              f"{result['best']:9.4f} s  x{ratio:5.2f}  memory x{memory_ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PyCORN with synthetic result files")
+    parser.add_argument('--cases', nargs='+', choices=list(cases), default=list(cases), metavar='CASE',
+                        help=f"Cases to run (default: all): {', '.join(cases)}")
+    parser.add_argument('--points', nargs='+', type=int, default=[1000, 100000, 1000000],
+                        help="Points per curve (default: 1000 100000 1000000)")
+    parser.add_argument('--curves', nargs='+', type=int, default=[4], help="Curves per file (default: 4)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case, the best one counts")
+    parser.add_argument('--data-dir', default=bench_dir / 'data', help="Directory of the generated files")
+    parser.add_argument('--output', default=None,
+                        help="Result file (default: results/<date>_<commit>.json next to this script)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two result files instead of running, exits with 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Slow-down counted as regression by --compare (default: 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    results = run(args.cases, args.points, args.curves, args.repeat, args.data_dir)
+    output = args.output
+    if output is None:
+        commit = (results['meta']['commit'] or 'unknown').replace('+', '-dirty')
+        output = bench_dir / 'results' / f"{time.strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print("Results written to: " + str(output))
+
+
+if __name__ == '__main__':
+    main()
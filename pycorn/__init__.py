@@ -1 +1,40 @@
-from .pycorn import *
+"""
+PyCORN - extract data from UNICORN result files (.res/.zip).
+
+The names below are imported from their modules on first access, so `import pycorn` only loads
+the standard library and numpy/xmltodict are only imported once data is decoded.
+"""
+import importlib
+
+# name: module it is defined in
+_exports = {
+    'PcRes3': 'pycorn',
+    'PcUni6': 'pycorn',
+    'ResHeader': 'pycorn',
+    'return_on_failure': 'pycorn',
+    'try_except_wrapper': 'pycorn',
+    'Curve': 'curves',
+    'EventList': 'curves',
+    'LoadStats': 'stats',
+    'LoadResult': 'batch',
+    'load_many': 'batch',
+    'load_file': 'batch',
+    'ResFollower': 'follow',
+    'RunCache': 'cache',
+    'AsyncLoader': 'aio',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    module_name = _exports.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
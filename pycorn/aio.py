@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Loading result files from asyncio code without blocking the event loop.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .batch import load_file
+from .batch import result_class
+from .curves import Curve
+from .curves import EventList
+from .pycorn import PcRes3
+from .pycorn import PcUni6
+
+
+class AsyncLoader:
+    """
+    Load result files in an executor, at most `max_concurrent` at a time.
+
+    Concurrent load() calls for the same file with the same options share one load.
+    Cancelling a call only cancels the load once no other call waits for it; a load that has
+    already started in the executor runs to its end there, but its result is dropped.
+
+    Example (e.g. in an aiohttp handler):
+        loader = AsyncLoader(executor=ProcessPoolExecutor(4), max_concurrent=4)
+        data = await loader.load("run.zip", curves=["UV 1_280"])
+        async for block in loader.iter_blocks("run.res"):
+            await send(block.name, block.volumes, block.values)
+    """
+
+    def __init__(self, executor=None, max_concurrent=None, cache=None):
+        """
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor, optional, default: the default executor of the event loop.
+            With a ProcessPoolExecutor iter_blocks() still decodes in the default executor,
+            its blocks are decoded one at a time from an open file.
+        max_concurrent : int, optional, number of files loaded or open in iter_blocks() at once.
+            Default: number of CPUs
+        cache : RunCache, optional, passed on to load_file()
+        """
+        self.executor = executor
+        self.max_concurrent = max_concurrent or os.cpu_count() or 1
+        self.cache = cache
+        self._thread_executor = None if isinstance(executor, ProcessPoolExecutor) else executor
+        # created in the running loop, asyncio objects of Python < 3.10 are bound to the loop they are created in
+        self._semaphore = None
+        # load key: shared task and the number of calls waiting for it
+        self._loads = {}
+        self._waiters = {}
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def _run(self, executor, function, *args):
+        async with self._get_semaphore():
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args))
+
+    async def load(self, file_name, curves=None, chromatograms=None, reduce=1, inj_sel=-1, as_tuples=False):
+        """
+        Load a result file completely, see load_file()
+
+        Returns
+        -------
+        data : PcRes3 or PcUni6, shared by all calls that were coalesced into one load
+        """
+        file_name = os.fspath(file_name)
+        stat = os.stat(file_name)
+        options = dict(curves=curves, chromatograms=chromatograms, reduce=reduce, inj_sel=inj_sel,
+                       as_tuples=as_tuples, cache=self.cache)
+        key = (os.path.realpath(file_name), stat.st_size, stat.st_mtime_ns,
+               None if curves is None else tuple(curves),
+               None if chromatograms is None else tuple(chromatograms), reduce, inj_sel, as_tuples)
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(self.executor, partial(load_file, file_name, **options)))
+            self._loads[key] = task
+            self._waiters[key] = 0
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] == 0:
+                del self._loads[key]
+                del self._waiters[key]
+                if not task.done():
+                    # the last caller has been cancelled
+                    task.cancel()
+
+    async def iter_blocks(self, file_name, curves=None, chromatograms=None, reduce=1, inj_sel=-1,
+                          as_tuples=False):
+        """
+        Yield the curves and annotations (Curve and EventList) of a result file as soon as each is decoded
+
+        Parameters as for load(), the blocks are not shared with other calls.
+        The file takes one of the `max_concurrent` slots until it is closed after the last block.
+        """
+        file_name = os.fspath(file_name)
+        loop = asyncio.get_running_loop()
+        # the file counts against max_concurrent from opening to closing, not per block
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        data = blocks = None
+        # the file is only closed once the block being decoded is done, even if we are cancelled
+        lock = threading.Lock()
+        try:
+            cls = await loop.run_in_executor(self._thread_executor, result_class, file_name)
+            if cls is PcRes3:
+                data = PcRes3(file_name, reduce=reduce, inj_sel=inj_sel, as_tuples=as_tuples, use_mmap=True,
+                              lazy=True)
+                blocks = _res3_blocks(data, curves)
+            else:
+                data = PcUni6(file_name, as_tuples=as_tuples, lazy=True)
+                blocks = _uni6_blocks(data, curves, chromatograms)
+            while True:
+                block = await loop.run_in_executor(self._thread_executor, _next_block, blocks, lock)
+                if block is None:
+                    return
+                yield block
+        finally:
+            if blocks is None:
+                semaphore.release()
+            else:
+                closing = loop.run_in_executor(self._thread_executor, _close_blocks, blocks, data, lock)
+                closing.add_done_callback(lambda _: semaphore.release())
+
+
+def _next_block(blocks, lock):
+    with lock:
+        return next(blocks, None)
+
+
+def _close_blocks(blocks, data, lock):
+    with lock:
+        blocks.close()
+        data.close()
+
+
+def _res3_blocks(data, curves):
+    data.load()
+    if curves is not None:
+        for name in data.curve_names():
+            if name not in curves:
+                del data[name]
+    for name in list(data.keys()):
+        block = data[name]
+        if isinstance(block, (Curve, EventList)):
+            yield block
+
+
+def _uni6_blocks(data, curves, chromatograms):
+    data.load()
+    for key in data.chromatogram_keys():
+        if chromatograms is None or key.replace(".Xml", "") in chromatograms:
+            yield from data._iter_xml_parse(key, curves=curves)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Loading many UNICORN result files (.res/.zip) in parallel processes.
+"""
+import os
+from collections import deque
+from collections import namedtuple
+from time import perf_counter
+
+from .pycorn import PcRes3
+from .pycorn import PcUni6
+from .stats import LoadStats
+
+_zip_magic = b'PK\x03\x04'
+
+LoadResult = namedtuple('LoadResult', ['path', 'data', 'error', 'traceback', 'stats'], defaults=(None,))
+LoadResult.__doc__ = """
+Result of loading one file: the loaded PcRes3/PcUni6 object in `data`,
+or None and the exception and its formatted traceback if loading failed.
+`stats` is the LoadStats of this file if stats were requested.
+"""
+
+
+def result_class(file_name):
+    """
+    Detect the format of a result file from its first bytes
+
+    Returns
+    -------
+    PcRes3 or PcUni6
+
+    Raises
+    ------
+    ValueError if the file is neither a UNICORN 3.10 res-file nor a UNICORN >= 6 zip-bundle
+    """
+    with open(file_name, 'rb') as f:
+        head = f.read(len(PcRes3.RES_magic_id))
+    if head == PcRes3.RES_magic_id:
+        return PcRes3
+    if head.startswith(_zip_magic):
+        return PcUni6
+    raise ValueError(f"{file_name} is not a supported UNICORN result file")
+
+
+def load_file(file_name, curves=None, chromatograms=None, reduce=1, inj_sel=-1, as_tuples=False, cache=None,
+              stats=None):
+    """
+    Detect the format of a result file and load it completely
+
+    Parameters
+    ----------
+    file_name : str or Path
+    curves : list, optional, only load the curves with these names. Default: all curves
+    chromatograms : list, optional, UNICORN >= 6 only, chromatograms to load. Default: all chromatograms
+    reduce : int, optional, UNICORN 3.10 only, keep only every n-th sample
+    inj_sel : int, optional, UNICORN 3.10 only, injection point used as zero volume
+    as_tuples : bool, optional, store curve data as lists of tuples
+    cache : RunCache, optional, return the decoded file from this cache, loading and storing it on a miss
+    stats : LoadStats, optional, record the stages of loading, a cache lookup is recorded as one stage 'cache'
+
+    Returns
+    -------
+    data : PcRes3 or PcUni6
+    """
+    file_name = os.fspath(file_name)
+    if cache is not None:
+        start = perf_counter()
+        data = cache.load(file_name, curves=curves, chromatograms=chromatograms, reduce=reduce, inj_sel=inj_sel,
+                          as_tuples=as_tuples)
+        if stats is not None:
+            stats.record('cache', perf_counter() - start, n_bytes=os.path.getsize(file_name), source=file_name)
+        return data
+    cls = result_class(file_name)
+    if cls is PcRes3:
+        with PcRes3(file_name, reduce=reduce, inj_sel=inj_sel, as_tuples=as_tuples,
+                    use_mmap=True, lazy=True, stats=stats) as data:
+            data.load()
+            if curves is not None:
+                for name in data.curve_names():
+                    if name not in curves:
+                        del data[name]
+            data.decode_all()
+        return data
+    data = PcUni6(file_name, as_tuples=as_tuples, stats=stats)
+    if curves is None and chromatograms is None:
+        data.load_all_xml()
+    else:
+        data.load_curves(curves=curves, chromatograms=chromatograms)
+    return data
+
+
+def _load_one(file_name, kwargs):
+    # every file gets its own stats, they are added up by load_many()
+    stats = None if kwargs.get('stats') is None else LoadStats()
+    try:
+        return LoadResult(file_name, load_file(file_name, **dict(kwargs, stats=stats)), None, None, stats)
+    except Exception as e:
+        import traceback
+        return LoadResult(file_name, None, e, traceback.format_exc(), stats)
+
+
+def load_many(paths, workers=None, ordered=True, max_pending=None, stats=None, **kwargs):
+    """
+    Load many result files in a pool of worker processes
+
+    Every file gets its own LoadResult, a file that fails to load does not stop the batch.
+    At most `max_pending` files are loaded or waiting to be consumed at any time,
+    so memory stays bounded however many paths are passed.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path
+    workers : int, optional, number of worker processes. Default: number of CPUs,
+        with 0 or 1 the files are loaded in the calling process
+    ordered : bool, optional, yield results in the order of `paths` (default) or as soon as they are done
+    max_pending : int, optional, default: 2 * workers
+    stats : LoadStats, optional, the stats of every file (in LoadResult.stats) are added to it
+    kwargs : passed on to load_file (curves, chromatograms, reduce, inj_sel, as_tuples, cache)
+
+    Yields
+    ------
+    result : LoadResult
+    """
+    kwargs['stats'] = stats
+    for result in _map_files(_load_one, paths, kwargs, workers=workers, ordered=ordered, max_pending=max_pending):
+        if stats is not None and result.stats is not None:
+            stats.merge(result.stats)
+        yield result
+
+
+def _map_files(function, paths, kwargs, workers=None, ordered=True, max_pending=None):
+    """
+    Call function(path, kwargs) for every path in a pool of worker processes, see load_many().
+    `function` returns a LoadResult and catches its own errors, errors of the worker process
+    itself are turned into a LoadResult as well.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for file_name in paths:
+            yield function(file_name, kwargs)
+        return
+    if max_pending is None:
+        max_pending = 2 * workers
+    # only imported here, it is slow to import and not needed by worker processes
+    from concurrent.futures import FIRST_COMPLETED
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures import wait
+
+    paths = iter(paths)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit():
+            for file_name in paths:
+                pending.append((file_name, executor.submit(function, file_name, kwargs)))
+                if len(pending) >= max_pending:
+                    break
+
+        try:
+            submit()
+            while pending:
+                if ordered:
+                    file_name, future = pending.popleft()
+                else:
+                    done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                    file_name, future = next(item for item in pending if item[1] in done)
+                    pending.remove((file_name, future))
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # the worker itself failed, e.g. it crashed or the result could not be sent back
+                    import traceback
+                    result = LoadResult(file_name, None, e, traceback.format_exc())
+                submit()
+                yield result
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of decoded result files.
+
+Every entry is a directory holding `index.json` (the structure of the loaded
+object, with curves and events described by name, unit, ...) and `arrays.bin`
+(all volume/value arrays, 64-byte aligned). A warm open memory-maps `arrays.bin`
+and rebuilds the Curve/EventList objects on top of it, the result file itself
+is neither decompressed nor parsed again.
+"""
+import hashlib
+import inspect
+import json
+import mmap
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from .batch import load_file
+from .curves import Curve
+from .curves import EventList
+from .pycorn import PcRes3
+from .pycorn import PcUni6
+from .pycorn import _restore
+
+_classes = {'PcRes3': PcRes3, 'PcUni6': PcUni6}
+_index_name = 'index.json'
+_arrays_name = 'arrays.bin'
+_alignment = 64
+_cache_version = 2
+# default load options, so that e.g. load(f) and load(f, reduce=1) share one entry
+_default_options = {name: parameter.default for name, parameter in inspect.signature(load_file).parameters.items()
+                    if parameter.default is not inspect.Parameter.empty and name not in ('cache', 'stats')}
+
+
+class _EntryWriter:
+    """
+    Turns a loaded result into a json-compatible structure, arrays are collected separately
+    """
+
+    def __init__(self):
+        self.arrays = []
+        self.n_bytes = 0
+
+    def array(self, arr):
+        arr = np.ascontiguousarray(arr)
+        offset = -self.n_bytes % _alignment + self.n_bytes
+        self.arrays.append((offset, arr))
+        self.n_bytes = offset + arr.nbytes
+        return {'__array__': [arr.dtype.str, offset, len(arr)]}
+
+    def encode(self, value):
+        if isinstance(value, Curve):
+            return {'__curve__': dict(self._block(value), volumes=self.array(value.raw_volumes),
+                                      values=self.array(value.values), unit=value.unit,
+                                      as_tuples=value.as_tuples)}
+        if isinstance(value, EventList):
+            acc_time = None if value.acc_time is None else self.array(value.acc_time)
+            return {'__events__': dict(self._block(value), volumes=self.array(value.raw_volumes),
+                                       labels=value.labels, acc_time=acc_time)}
+        if isinstance(value, np.ndarray) and value.ndim == 1:
+            return self.array(value)
+        if isinstance(value, bytes):
+            return {'__bytes__': value.hex()}
+        if type(value) in (dict, OrderedDict):
+            return {'__dict__': [[key, self.encode(sub_value)] for key, sub_value in value.items()]}
+        if isinstance(value, (list, tuple)):
+            return [self.encode(sub_value) for sub_value in value]
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        raise TypeError(f"cannot cache values of type {type(value).__name__}")
+
+    def _block(self, block):
+        return dict(name=block.name, run_name=block.run_name, data_type=block.data_type,
+                    magic_id=self.encode(block.magic_id), chrom_id=block.chrom_id,
+                    column_vol=block.column_vol, header=self.encode(block.header),
+                    volume_offset=block.volume_offset, decimals=block.decimals)
+
+    def write_arrays(self, file_name):
+        with open(file_name, 'wb') as f:
+            for offset, arr in self.arrays:
+                f.write(b'\x00' * (offset - f.tell()))
+                f.write(arr.tobytes())
+
+
+class _EntryReader:
+    """
+    Rebuilds the objects written by _EntryWriter, arrays are read-only views on the mapped arrays.bin
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(sub_value) for sub_value in value]
+        if not isinstance(value, dict):
+            return value
+        (kind, content), = value.items()
+        if kind == '__array__':
+            dtype, offset, count = content
+            if count == 0:
+                return np.empty(0, dtype=dtype)
+            return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+        if kind == '__bytes__':
+            return bytes.fromhex(content)
+        if kind == '__dict__':
+            return {key: self.decode(sub_value) for key, sub_value in content}
+        block = {key: self.decode(sub_value) for key, sub_value in content.items()}
+        if kind == '__curve__':
+            return Curve(block.pop('name'), block.pop('volumes'), block.pop('values'), **block)
+        return EventList(block.pop('name'), block.pop('volumes'), **block)
+
+
+class RunCache:
+    """
+    Size-bounded cache of decoded result files in `directory`.
+
+    Entries are keyed by the absolute path, size and modification time of the file,
+    a hash of its content (unless hash_content=False) and the load options.
+    When the cache grows beyond `max_bytes`, the least recently used entries are removed.
+
+    Example:
+        cache = RunCache("~/.cache/pycorn")
+        data = cache.load("sample1.zip", curves=["UV 1_280", "Cond"])
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30, hash_content=True):
+        self.directory = os.path.expanduser(os.fspath(directory))
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, file_name, **options):
+        """
+        Fingerprint of a result file together with the options it is loaded with
+        """
+        file_name = os.path.abspath(os.fspath(file_name))
+        stat = os.stat(file_name)
+        fingerprint = hashlib.blake2b(digest_size=16)
+        options = dict(_default_options, **options)
+        fingerprint.update(repr((_cache_version, file_name, stat.st_size, stat.st_mtime_ns,
+                                 sorted(options.items()))).encode())
+        if self.hash_content:
+            with open(file_name, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    fingerprint.update(chunk)
+        return fingerprint.hexdigest()
+
+    def load(self, file_name, **options):
+        """
+        Return the cached result of load_file(file_name, **options), loading and storing it on a miss
+        """
+        key = self.key(file_name, **options)
+        data = self._read(key)
+        if data is None:
+            data = load_file(file_name, **options)
+            self._write(key, data)
+        return data
+
+    def get(self, file_name, **options):
+        """
+        Cached result of load_file(file_name, **options) or None
+        """
+        return self._read(self.key(file_name, **options))
+
+    def put(self, file_name, data, **options):
+        """
+        Store `data`, the result of load_file(file_name, **options).
+        Returns False if the data contains values that cannot be cached.
+        """
+        return self._write(self.key(file_name, **options), data)
+
+    def _read(self, key):
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, _index_name), encoding='utf-8') as f:
+                index = json.load(f)
+            # the modification time of the index marks the last use of an entry
+            os.utime(os.path.join(entry, _index_name))
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            buffer = b''
+            if index['n_bytes']:
+                with open(os.path.join(entry, _arrays_name), 'rb') as f:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(buffer) != index['n_bytes']:
+                raise ValueError(f"{_arrays_name} has {len(buffer)} bytes instead of {index['n_bytes']}")
+            reader = _EntryReader(buffer)
+            cls = _classes[index['class']]
+            state = reader.decode(index['state'])
+            state.update({name: None for name in cls._not_pickled})
+            state['_pending'] = set(index['pending'])
+            items = [(key, reader.decode(value)) for key, value in index['items']]
+        except (OSError, ValueError):
+            # arrays.bin was deleted or truncated: drop the entry, it is stored again on the next load
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        return _restore(cls, state, items)
+
+    def _write(self, key, data):
+        if data._decode_before_pickling:
+            data.decode_all()
+        writer = _EntryWriter()
+        try:
+            state = {name: value for name, value in vars(data).items()
+                     if name not in data._not_pickled and name != '_pending'}
+            index = {'class': type(data).__name__,
+                     'state': writer.encode(state),
+                     'pending': sorted(data._pending),
+                     'items': [[name, writer.encode(OrderedDict.__getitem__(data, name))] for name in data]}
+        except TypeError:
+            return False
+        index['n_bytes'] = writer.n_bytes
+
+        tmp_entry = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}')
+        os.makedirs(tmp_entry)
+        try:
+            writer.write_arrays(os.path.join(tmp_entry, _arrays_name))
+            with open(os.path.join(tmp_entry, _index_name), 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_entry, os.path.join(self.directory, key))
+        except OSError:
+            # another process stored the same entry in the meantime
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict(keep=key)
+        return True
+
+    def entries(self):
+        """
+        List of (key, size in bytes, last use) of all entries, least recently used first
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if key.startswith('.'):
+                continue
+            try:
+                last_use = os.stat(os.path.join(entry, _index_name)).st_mtime
+                size = sum(os.stat(os.path.join(entry, name)).st_size for name in os.listdir(entry))
+            except FileNotFoundError:
+                continue
+            entries.append((key, size, last_use))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        """
+        Total size of all entries in bytes
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits into max_bytes
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        for key in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+pycorn-bin - extract, plot and check UNICORN result files from the command line.
+
+Matplotlib and xlsxwriter are only imported when plots or xlsx-files are written,
+with --jobs the files are processed in parallel processes.
+"""
+import argparse
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+from importlib.util import find_spec
+
+from .batch import LoadResult
+from .batch import _map_files
+from .pycorn import PcRes3
+from .pycorn import PcUni6
+
+pcscript_version = 0.15
+
+
+class _NotSupported(Exception):
+    """
+    A file failed --check, the details have been printed already
+    """
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pycorn-bin",
+        description="Extract data from UNICORN .res files to .csv/.txt and plot them (matplotlib required)",
+        epilog="Make it so!")
+    parser.add_argument("-c", "--check", help="Perform simple check if file is supported", action="store_true")
+    parser.add_argument("-n", "--info", help="Display entries in header", action="store_true")
+    parser.add_argument("-i", "--inject", type=int, default=-1,
+                        help="Set injection number # as zero retention, use -t to find injection points", metavar="#")
+    parser.add_argument("-r", "--reduce", type=int, default=1, help="Write/Plot only every n sample", metavar="#")
+    parser.add_argument("-t", "--points", help="Display injection points", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="Process N files in parallel processes, 0 = number of CPUs (default: 1)")
+
+    group0 = parser.add_argument_group('Extracting', 'Options for writing csv/txt files')
+    group0.add_argument("-e", "--extract", type=str, choices=['csv', 'xlsx'],
+                        help="Write data to csv or xlsx file for supported data blocks")
+
+    group1 = parser.add_argument_group('Plotting', 'Options for plotting')
+    group1.add_argument("-p", "--plot", help='Plot curves', action="store_true")
+    group1.add_argument("--no_fractions", help="Disable plotting of fractions", action="store_true")
+    group1.add_argument("--no_inject", help="Disable plotting of inject marker(s)", action="store_true")
+    group1.add_argument("--no_legend", help="Disable legend for plot", action="store_true")
+    group1.add_argument("--no_title", help="Disable title for plot", action="store_true")
+    group1.add_argument("--xmin", type=float, default=None, help="Lower bound on the x-axis", metavar="#")
+    group1.add_argument("--xmax", type=float, default=None, help="Upper bound on the x-axis", metavar="#")
+    group1.add_argument("--par1", type=str, default='Cond',
+                        help="Data for 2nd y-axis (Default=Cond), to disable 2nd y-axis, use --par1 None")
+    group1.add_argument("--par2", type=str, default=None, help="Data for 3rd y-axis (Default=None)")
+    group1.add_argument('-f', '--format', type=str,
+                        choices=['svg', 'svgz', 'tif', 'tiff', 'jpg', 'jpeg', 'png', 'ps', 'eps', 'raw', 'rgba',
+                                 'pdf', 'pgf'], default='pdf', help="File format of plot files (default: pdf)")
+    group1.add_argument('--downsample', type=str, choices=['minmax', 'lttb', 'none'], default='minmax',
+                        help="Reduce curves to the pixel width of the plot before plotting (default: minmax)")
+    group1.add_argument('-d', '--dpi', default=300, type=int,
+                        help="DPI (dots per inch) for raster images (png, jpg, etc.). Default is 300.")
+    parser.add_argument("-u", "--user", help="Show stored user name", action="store_true")
+    parser.add_argument('--version', action='version', version=str(pcscript_version))
+    parser.add_argument("inp_res", help="Input .res file(s)", nargs='+', metavar="<file>.res")
+    return parser
+
+
+def plotterX(inp, fname, args):
+    if isinstance(inp, PcRes3):
+        runs = {inp.run_name: inp}
+        inject_vol = inp.inject_vol
+    else:
+        # only the decoded chromatograms, the bundle is read lazily
+        runs = {key: inp[key] for key in list(inp) if inp.is_decoded(key) and type(inp[key]) is dict}
+        inject_vol = 0.0
+    from .plotting import plot_run
+    for run_name, blocks in runs.items():
+        plot_file = fname[:-4] + "_" + run_name + "_plot." + args.format
+        plot_run(blocks, plot_file, title=None if args.no_title else fname, x_min=args.xmin, x_max=args.xmax,
+                 par1=None if args.par1 == 'None' else args.par1, par2=args.par2,
+                 fractions=not args.no_fractions, inject_vol=0.0 if args.no_inject else inject_vol,
+                 legend=not args.no_legend, dpi=args.dpi,
+                 downsampling=None if args.downsample == 'none' else args.downsample)
+
+
+def data_writer1(fname, inp):
+    '''
+    writes sensor/run-data to csv-files
+    '''
+    from .export import write_csv
+    for out_file in write_csv(inp, fname):
+        print("Written: " + out_file)
+
+
+def generate_xls(inp, fname):
+    '''
+    Input = pycorn object
+    output = xlsx file, <file>_<run>.xlsx for res-files, <file>.xlsx with a sheet per chromatogram for zip-bundles
+    '''
+    from .export import write_xlsx
+    if isinstance(inp, PcRes3):
+        xls_filename = fname[:-4] + "_" + inp.run_name + ".xlsx"
+        write_xlsx({inp.run_name: inp}, xls_filename)
+    else:
+        xls_filename = fname[:-4] + ".xlsx"
+        # every chromatogram is written as a run of its own, i.e. to its own sheet
+        write_xlsx({key: {key: inp[key]} for key in list(inp) if inp.is_decoded(key) and type(inp[key]) is dict},
+                   xls_filename)
+    print("Data written to: " + xls_filename)
+
+
+def process_res3(fname, args):
+    """
+    Run the selected actions on a res-file, blocks are only decoded for extracting and plotting
+    """
+    with PcRes3(fname, reduce=args.reduce, inj_sel=args.inject, use_mmap=True, lazy=True) as fdata:
+        if args.check and not fdata.input_check(show=True):
+            raise _NotSupported("not a supported UNICORN 3.10 res-file")
+        if args.info:
+            fdata.readheader()
+            fdata.showheader()
+        if args.points:
+            fdata.readheader()
+            fdata.inject_det(show=True)
+        if args.user:
+            print("User: " + fdata.get_user())
+        if args.extract or args.plot:
+            fdata.load()
+            fdata.decode_all()
+    return fdata
+
+
+def process_uni6(fname, args):
+    """
+    Run the selected actions on a zip-bundle, the curves are only decoded for extracting and plotting
+    """
+    fdata = PcUni6(fname, lazy=True)
+    with fdata:
+        fdata.load()
+        if args.check:
+            print(f" ---- \n Input file: {fname}")
+            if 'Manifest.xml' not in fdata or not fdata.chromatogram_keys():
+                raise _NotSupported("not a supported UNICORN 6 zip-bundle")
+            print(" Input is a UNICORN 6 zip-bundle with " + ", ".join(fdata.chromatogram_keys()))
+        if args.info:
+            print(f" ---- \n Members of {fname}: \n")
+            for key in fdata.keys():
+                if not key.endswith("_dict"):
+                    print(" ", key)
+        if args.points or args.user:
+            print(" Injection points and user name are only stored in UNICORN 3.10 res-files")
+        if args.extract or args.plot:
+            fdata.load_all_xml()
+    return fdata
+
+
+def process_file(fname, args):
+    """
+    Run the actions selected by the command line arguments `args` on one file
+    """
+    if fname.lower().endswith(".zip"):
+        fdata = process_uni6(fname, args)
+    else:
+        fdata = process_res3(fname, args)
+    if args.extract == 'csv':
+        data_writer1(fname, fdata)
+    if args.extract == 'xlsx':
+        generate_xls(fdata, fname)
+    if args.plot:
+        plotterX(fdata, fname, args)
+
+
+def _run_file(fname, args):
+    # the output of a file is collected, so files processed in parallel do not mix their output
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            process_file(fname, args)
+        except Exception as e:
+            import traceback
+            return LoadResult(fname, output.getvalue(), e, traceback.format_exc())
+    return LoadResult(fname, output.getvalue(), None, None)
+
+
+def main(argv=None):
+    """
+    Entry point of pycorn-bin
+
+    Returns
+    -------
+    exit code : int, 0 if all files were processed, 1 if any of them failed
+    """
+    args = build_parser().parse_args(argv)
+    if args.plot and find_spec("matplotlib") is None:
+        print("WARNING: Matplotlib not found - Plotting disabled!")
+        args.plot = False
+    if args.extract == 'xlsx' and find_spec("xlsxwriter") is None:
+        print("WARNING: xlsxwriter not found - xlsx-output disabled!")
+        args.extract = None
+
+    failed = 0
+    # the LoadResult of every file holds its printed output as data
+    for result in _map_files(_run_file, args.inp_res, args, workers=args.jobs or os.cpu_count()):
+        if result.data:
+            print(result.data, end='')
+        if result.error is None:
+            print(f"OK    {result.path}")
+            continue
+        failed += 1
+        print(f"FAIL  {result.path}: {result.error}")
+        if not isinstance(result.error, _NotSupported):
+            print(result.traceback, file=sys.stderr)
+    if len(args.inp_res) > 1:
+        print(f"{len(args.inp_res) - failed} of {len(args.inp_res)} files processed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Compact containers for the data blocks returned by PcRes3 and PcUni6.
+
+Both keep their data in contiguous numpy arrays and carry the block metadata as
+attributes. For compatibility they can still be read like the dicts used before,
+e.g. `curve['data']`, `curve['unit']` or `events['data_name']`.
+"""
+import codecs
+from abc import abstractmethod
+from collections.abc import Mapping
+
+
+def _equal(a, b):
+    """
+    Compare two attributes of blocks, arrays by their contents
+    """
+    if hasattr(a, 'shape') or hasattr(b, 'shape'):
+        import numpy as np
+        a, b = np.asarray(a), np.asarray(b)
+        # NaN in the same places counts as equal, only possible for float arrays
+        equal_nan = a.dtype.kind in 'fc' and b.dtype.kind in 'fc'
+        return np.array_equal(a, b, equal_nan=equal_nan)
+    return a == b
+
+
+class _Block(Mapping):
+    """
+    Read-only dict view shared by Curve and EventList
+
+    The volumes are stored once as `raw_volumes`, `volumes` are the raw volumes minus
+    `volume_offset` (e.g. the injection volume), rounded to `decimals` if set. They are
+    computed on first access and kept until the offset changes.
+    """
+    __slots__ = ('name', 'run_name', 'data_type', 'magic_id', 'chrom_id', 'column_vol', 'header',
+                 'raw_volumes', 'volume_offset', 'decimals', '_volumes')
+
+    # keys of the dict view besides 'data' and the entries in `header`
+    _view_keys = ('run_name', 'data_name', 'data_type', 'magic_id')
+    # attributes compared by ==
+    _compared = ('name', 'run_name', 'data_type', 'magic_id', 'chrom_id', 'column_vol', 'header', 'volumes')
+
+    def __init__(self, name, run_name='', data_type=None, magic_id=None, chrom_id=None, column_vol=None,
+                 header=None, volume_offset=0.0, decimals=None):
+        self.name = name
+        self.run_name = run_name
+        self.data_type = data_type
+        self.magic_id = magic_id
+        self.chrom_id = chrom_id
+        self.column_vol = column_vol
+        self.header = header if header is not None else {}
+        self.volume_offset = volume_offset
+        self.decimals = decimals
+        self._volumes = None
+
+    @property
+    def volumes(self):
+        if self._volumes is None:
+            volumes = self.raw_volumes
+            if self.volume_offset:
+                volumes = volumes - self.volume_offset
+            if self.decimals is not None:
+                volumes = volumes.round(self.decimals)
+            self._volumes = volumes
+        return self._volumes
+
+    @volumes.setter
+    def volumes(self, volumes):
+        self.raw_volumes = volumes
+        self.volume_offset = 0.0
+        self.decimals = None
+        self._volumes = volumes
+
+    def set_volume_offset(self, offset):
+        """
+        Make the volumes relative to `offset`, they are recomputed from the raw volumes on next access
+        """
+        if offset != self.volume_offset:
+            self.volume_offset = offset
+            self._volumes = None
+
+    def _keys(self):
+        keys = ['data', *self._view_keys]
+        if self.chrom_id is not None:
+            keys += ['chrom_id', 'column_vol']
+        return keys + list(self.header)
+
+    @abstractmethod
+    def _data(self):
+        """
+        The value of the 'data' key
+        """
+
+    def __getitem__(self, key):
+        if key in self.header:
+            return self.header[key]
+        if key not in self._keys():
+            raise KeyError(key)
+        if key == 'data':
+            return self._data()
+        if key == 'data_name':
+            return self.name
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._keys()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __eq__(self, other):
+        # the dict comparison of Mapping would compare the arrays element-wise
+        if isinstance(other, _Block):
+            return type(self) is type(other) and all(_equal(getattr(self, key), getattr(other, key))
+                                                     for key in self._compared)
+        if isinstance(other, Mapping):
+            return set(self) == set(other) and all(_equal(self[key], other[key]) for key in self)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+
+class Curve(_Block):
+    """
+    A sensor curve (UV, Cond, ...), volumes and values are held as two arrays of equal length.
+    `curve['data']` returns the volume/value pairs as an array of shape (n, 2),
+    or as a list of tuples if the curve was created with as_tuples=True.
+    """
+    __slots__ = ('values', 'unit', 'as_tuples')
+
+    _view_keys = _Block._view_keys + ('unit',)
+    _compared = _Block._compared + ('unit', 'values')
+
+    def __init__(self, name, volumes, values, unit=None, as_tuples=False, **kwargs):
+        super().__init__(name, **kwargs)
+        self.raw_volumes = volumes
+        self.values = values
+        self.unit = unit
+        self.as_tuples = as_tuples
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name!r}, unit={self.unit!r}, points={len(self.volumes)})"
+
+    def _data(self):
+        if self.as_tuples:
+            return list(zip(self.volumes.tolist(), self.values.tolist()))
+        import numpy as np
+        return np.column_stack((self.volumes, self.values))
+
+
+class EventList(_Block):
+    """
+    Annotations of a run (Logbook, Fractions, Injection, ...): the volume of each event
+    as an array and its label. res3-files also provide the accumulated time of each event,
+    their labels are only decoded from the raw records when they are first read.
+    `events['data']` returns a list of (volume, label) tuples.
+    """
+    __slots__ = ('acc_time', '_labels', '_raw_labels')
+
+    _compared = _Block._compared + ('labels', 'acc_time')
+
+    def __init__(self, name, volumes, labels=None, raw_labels=None, acc_time=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.raw_volumes = volumes
+        self.acc_time = acc_time
+        self._labels = labels
+        self._raw_labels = raw_labels
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name!r}, events={len(self.volumes)})"
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = [codecs.decode(label, 'iso8859-1') for label in self._raw_labels.tolist()]
+            self._raw_labels = None
+        return self._labels
+
+    def _data(self):
+        return list(zip(self.volumes.tolist(), self.labels))
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Export of loaded PcRes3/PcUni6 data to csv/txt files, xlsx workbooks and columnar Parquet/Arrow files.
+"""
+import itertools
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from .batch import LoadResult
+from .curves import Curve
+from .curves import EventList
+from .pycorn import PcRes3
+from .pycorn import PcUni6
+
+# rows formatted and written at once by write_csv/write_xlsx
+_chunk_size = 1 << 16
+# rows of a xlsx sheet
+_xlsx_max_rows = 1048576
+# characters that are not allowed in file names, e.g. in "Sample flow (CV/h)"
+_invalid_chars = re.compile(r'[\\/:*?"<>|]')
+
+
+def iter_blocks(data):
+    """
+    All curves, events and method/meta blocks of a loaded PcRes3 or PcUni6,
+    or of a dict with chromatogram name: chromatogram of a PcUni6 (e.g. a single chromatogram)
+
+    Yields
+    ------
+    (chromatogram, block) : the run name of a res3-file or the chromatogram name (e.g. "Chrom.1")
+        of a zip-bundle, and a Curve, EventList or meta dict
+    """
+    if isinstance(data, PcRes3):
+        for block in data.values():
+            yield data.run_name, block
+        return
+    # a plain dict holds decoded chromatograms only
+    is_decoded = data.is_decoded if isinstance(data, PcUni6) else lambda key: True
+    for key in list(data):
+        # skip members that have not been decoded, e.g. the xmltodict-versions of the xml members
+        if not is_decoded(key) or type(data[key]) is not dict:
+            continue
+        for block in data[key].values():
+            if isinstance(block, (Curve, EventList)):
+                yield key, block
+
+
+def write_csv(data, file_name, sep=',', float_format='%r'):
+    """
+    Write every curve and event block to its own csv-file and every meta block to a txt-file,
+    named <file_name without extension>_<run/chromatogram>_<data_name>.csv/.txt.
+    Rows are formatted in bulk, a chunk of rows at a time.
+
+    Parameters
+    ----------
+    data : loaded PcRes3 or PcUni6
+    file_name : str, name of the result file, used as base of the output files
+    sep : str, optional, column separator
+    float_format : str, optional, %-format of the volumes and values, e.g. '%.4f' (about twice as fast).
+        Default: '%r', the shortest representation that reads back to the same number
+
+    Returns
+    -------
+    files : list of the files written
+    """
+    base_name = os.path.splitext(os.fspath(file_name))[0]
+    files = []
+    for chromatogram, block in iter_blocks(data):
+        out_file = _invalid_chars.sub('_', f"{chromatogram}_{block['data_name']}")
+        out_file = f"{base_name}_{out_file}"
+        if block['data_type'] == 'meta':
+            out_file += '.txt'
+            with open(out_file, 'wb') as fout:
+                fout.write(block['data'].encode('utf-8'))
+        else:
+            out_file += '.csv'
+            if isinstance(block, Curve):
+                columns, row_format = (block.volumes, block.values), f'{float_format}{sep}{float_format}\r\n'
+            else:
+                columns, row_format = (block.volumes, block.labels), f'{float_format}{sep}%s\r\n'
+            with open(out_file, 'wb') as fout:
+                _write_rows(fout, columns, row_format)
+        files.append(out_file)
+    return files
+
+
+def _write_rows(fout, columns, row_format):
+    """
+    Write the columns row by row, each chunk of rows is formatted with a single %-operation
+    """
+    n_rows = len(columns[0])
+    for start in range(0, n_rows, _chunk_size):
+        stop = min(start + _chunk_size, n_rows)
+        # tolist() turns numpy floats into python floats, which %r prints like str()
+        chunk = [column[start:stop] for column in columns]
+        chunk = [column.tolist() if isinstance(column, np.ndarray) else column for column in chunk]
+        rows = tuple(itertools.chain.from_iterable(zip(*chunk)))
+        fout.write(((row_format * (stop - start)) % rows).encode('utf-8'))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required for the Parquet/Arrow export") from None
+    return pyarrow
+
+
+def _table_schema(pa):
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([('run', category), ('chromatogram', category), ('curve', category), ('unit', category),
+                      ('volume', pa.float64()), ('value', pa.float64()), ('label', pa.string())])
+
+
+def to_table(data, run=None):
+    """
+    All curves and events of a loaded PcRes3 or PcUni6 as one pyarrow Table in long format.
+    Every point is a row with the columns run, chromatogram, curve, unit, volume, value and label.
+    Curves have no label, events have no value.
+
+    Parameters
+    ----------
+    data : loaded PcRes3 or PcUni6
+    run : str, optional, value of the run column. Default: the file name without directory and extension
+
+    Returns
+    -------
+    table : pyarrow.Table
+    """
+    pa = _import_pyarrow()
+    if run is None:
+        run = _default_run_name(data)
+    blocks = [(chromatogram, block) for chromatogram, block in iter_blocks(data) if block['data_type'] != 'meta']
+    lengths = np.array([len(block.volumes) for _, block in blocks], dtype=np.int64)
+    n_rows = int(lengths.sum())
+
+    chromatograms = list(OrderedDict.fromkeys(chromatogram for chromatogram, _ in blocks))
+    names = list(OrderedDict.fromkeys(block.name for _, block in blocks))
+    units = list(OrderedDict.fromkeys(block.unit for _, block in blocks if getattr(block, 'unit', None) is not None))
+
+    def category(values, indices):
+        # one index per block, repeated for all points of the block, -1 for missing values
+        indices = np.repeat(np.asarray(indices, dtype=np.int32), lengths)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, mask=indices < 0),
+                                              pa.array(values, type=pa.string()))
+
+    volumes = np.empty(n_rows)
+    values = np.full(n_rows, np.nan)
+    labels = [None] * n_rows
+    is_curve = np.zeros(n_rows, dtype=bool)
+    start = 0
+    for (_, block), length in zip(blocks, lengths):
+        volumes[start:start + length] = block.volumes
+        if isinstance(block, Curve):
+            values[start:start + length] = block.values
+            is_curve[start:start + length] = True
+        else:
+            labels[start:start + length] = block.labels
+        start += length
+
+    return pa.Table.from_arrays(
+        [category([run], [0] * len(blocks)),
+         category(chromatograms, [chromatograms.index(chromatogram) for chromatogram, _ in blocks]),
+         category(names, [names.index(block.name) for _, block in blocks]),
+         category(units, [units.index(block.unit) if getattr(block, 'unit', None) is not None else -1
+                          for _, block in blocks]),
+         pa.array(volumes),
+         pa.array(values, mask=~is_curve),
+         pa.array(labels, type=pa.string())],
+        schema=_table_schema(pa))
+
+
+def write_table(runs, file_name, file_format=None):
+    """
+    Write all curves and events of one or many runs into a single Parquet or Arrow (IPC) file,
+    with the columns described in to_table(). Every run is written as its own row group/record batch,
+    so only one run is held in memory at a time.
+
+    Parameters
+    ----------
+    runs : a loaded PcRes3/PcUni6, an iterable of them (e.g. from load_many())
+        or a dict with run name: loaded data
+    file_name : str
+    file_format : str, optional, 'parquet' or 'arrow'. Default: from the file extension,
+        '.parquet'/'.pq' for Parquet, Arrow otherwise
+    """
+    pa = _import_pyarrow()
+    file_name = os.fspath(file_name)
+    if file_format is None:
+        file_format = 'parquet' if file_name.lower().endswith(('.parquet', '.pq')) else 'arrow'
+    schema = _table_schema(pa)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(file_name, schema)
+    elif file_format == 'arrow':
+        writer = pa.ipc.new_stream(file_name, schema)
+    else:
+        raise ValueError(f"unknown file format {file_format}")
+    with writer:
+        for run_name, run in _iter_runs(runs):
+            writer.write_table(to_table(run, run=run_name))
+
+
+def write_xlsx(runs, file_name, constant_memory=True):
+    """
+    Write the curves and events of one or many runs to a xlsx workbook, each run gets its own sheet.
+    Every block takes two columns (volume and value/label) below a header with its name and unit.
+    The loaded data is not modified.
+
+    With constant_memory=True (default) xlsxwriter flushes every row once it is written, so rows are
+    written one after another across all blocks and memory use does not grow with the number of points.
+    With constant_memory=False each block is written with one write_column() call per column,
+    which is faster but keeps the whole workbook in memory until it is closed.
+
+    Parameters
+    ----------
+    runs : a loaded PcRes3/PcUni6, an iterable of them (e.g. from load_many())
+        or a dict with run name: loaded data
+    file_name : str
+    constant_memory : bool, optional
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ImportError("xlsxwriter is required for the xlsx export") from None
+    with xlsxwriter.Workbook(os.fspath(file_name), {'constant_memory': constant_memory,
+                                                    'nan_inf_to_errors': True}) as workbook:
+        sheet_names = set()
+        for run_name, run in _iter_runs(runs):
+            sheet_name = _sheet_name(run_name, sheet_names)
+            sheet_names.add(sheet_name.lower())
+            _write_sheet(workbook.add_worksheet(sheet_name), run, constant_memory)
+
+
+def _write_sheet(worksheet, data, constant_memory):
+    blocks = [(chromatogram, block) for chromatogram, block in iter_blocks(data) if block['data_type'] != 'meta']
+    n_chromatograms = len(set(chromatogram for chromatogram, _ in blocks))
+    columns = []
+    headers = ([], [])
+    for chromatogram, block in blocks:
+        if len(block.volumes) + 2 > _xlsx_max_rows:
+            raise ValueError(f"{block.name} has too many points for a xlsx sheet, use reduce or write_table()")
+        name = block.name if n_chromatograms == 1 else f"{chromatogram}: {block.name}"
+        if isinstance(block, Curve):
+            columns += [block.volumes, block.values]
+            unit = block.unit
+        else:
+            columns += [block.volumes, block.labels]
+            unit = 'Fraction' if block.name == 'Fractions' else ''
+        headers[0].extend((name, ''))
+        headers[1].extend(('ml', unit))
+    worksheet.write_row(0, 0, headers[0])
+    worksheet.write_row(1, 0, headers[1])
+    if not constant_memory:
+        for col, column in enumerate(columns):
+            worksheet.write_column(2, col, column.tolist() if isinstance(column, np.ndarray) else column)
+        return
+    n_rows = max((len(column) for column in columns), default=0)
+    for start in range(0, n_rows, _chunk_size):
+        # the columns of all blocks still having points, as lists for the current chunk of rows
+        chunk = []
+        for col, column in enumerate(columns):
+            if len(column) > start:
+                column = column[start:start + _chunk_size]
+                if isinstance(column, np.ndarray):
+                    chunk.append((col, column.tolist(), worksheet.write_number))
+                else:
+                    chunk.append((col, column, worksheet.write))
+        for row in range(min(_chunk_size, n_rows - start)):
+            for col, column, write in chunk:
+                if row < len(column):
+                    write(start + row + 2, col, column[row])
+
+
+def _sheet_name(run_name, used_names):
+    """
+    A valid and unique worksheet name (max. 31 characters, no []:*?/\\)
+    """
+    base_name = re.sub(r'[\[\]:*?/\\]', '_', str(run_name))[:31] or 'run'
+    sheet_name = base_name
+    number = 1
+    while sheet_name.lower() in used_names:
+        number += 1
+        suffix = f" ({number})"
+        sheet_name = base_name[:31 - len(suffix)] + suffix
+    return sheet_name
+
+
+def _default_run_name(data):
+    return os.path.splitext(os.path.basename(os.fspath(data.file_name)))[0]
+
+
+def _iter_runs(runs):
+    """
+    (run name, loaded data) of a single run, of an iterable of runs or LoadResults or of a dict run name: data.
+    Failed LoadResults are skipped.
+    """
+    if isinstance(runs, (PcRes3, PcUni6)):
+        runs = [runs]
+    elif isinstance(runs, dict):
+        runs = runs.items()
+    for run in runs:
+        if isinstance(run, LoadResult):
+            if run.error is not None:
+                continue
+            run = run.data
+        if isinstance(run, tuple):
+            yield run
+        else:
+            yield _default_run_name(run), run
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Reading a UNICORN 3.10 res-file while it is still being written.
+"""
+import codecs
+import os
+import struct
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .curves import Curve
+from .curves import EventList
+from .pycorn import PcRes3
+
+_header_size = PcRes3._header_size
+_declaration_size = PcRes3._declaration_size
+_sensor_size = PcRes3._sensor_dtype.itemsize
+_record_stride = PcRes3._meta1_stride
+_record_size = PcRes3._meta1_dtype.itemsize
+
+
+class ResFollower:
+    """
+    Follow a growing res-file: every poll() re-reads only the header and decodes the samples
+    and annotation records (Logbook, Fractions, Inject) appended since the last poll.
+
+    The chunks are Curve/EventList objects holding only the new points. Their volumes are
+    not corrected for the injection, the injection marks arrive as chunks of the 'Inject' block.
+
+    Example:
+        with ResFollower("run.res", curves=["UV1_280nm", "Cond"]) as follower:
+            for chunk in follower.follow(interval=2.0, idle_timeout=600):
+                plot_append(chunk.name, chunk.volumes, chunk.values)
+    """
+    _sensor_ids = (PcRes3.SensData_id, PcRes3.SensData_id2)
+    _meta1_ids = (PcRes3.Logbook_id, PcRes3.Logbook_id2, PcRes3.Inject_id, PcRes3.Inject_id2,
+                  PcRes3.Fractions_id, PcRes3.Fractions_id2)
+
+    def __init__(self, file_name, curves=None, annotations=True):
+        """
+        Parameters
+        ----------
+        file_name : str or Path
+        curves : list, optional, only follow the sensors with these names. Default: all sensors
+        annotations : bool, optional, follow the Logbook, Fractions and Inject blocks as well (default)
+        """
+        self.file_name = os.fspath(file_name)
+        self.curves = curves
+        self.annotations = annotations
+        self.run_name = ''
+        # header entries as in PcRes3, by data name
+        self.blocks = OrderedDict()
+        # data name: file position up to which the block has been decoded
+        self.positions = {}
+        self._addresses = {}
+        self._units = {}
+        self._header = b''
+        self._file = open(self.file_name, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def read_header(self):
+        """
+        Re-read the declarations, they are only parsed again if they have changed
+
+        Returns
+        -------
+        complete : bool, False if the file does not have a complete header yet
+        """
+        f = self._file
+        f.seek(0)
+        header = f.read(_header_size)
+        if len(header) < _header_size:
+            return False
+        if not header.startswith(PcRes3.RES_magic_id):
+            raise ValueError(f"{self.file_name} is not a UNICORN 3.10 res-file")
+        # the declarations end with the LogBook entry
+        while True:
+            chunk = f.read(64 * _declaration_size)
+            header += chunk
+            end = PcRes3._declarations_end(header)
+            if end is not None:
+                header = header[:end]
+                break
+            if len(chunk) < 64 * _declaration_size:
+                return False
+        if header == self._header:
+            return True
+        self._header = header
+        self.blocks.clear()
+        for decl in struct.iter_unpack(PcRes3._declaration_format, header[_header_size:]):
+            entry = PcRes3._declaration(decl)
+            self.blocks[entry['data_name']] = entry
+            if entry['data_name'] == 'Logbook':
+                self.run_name = entry['run_name']
+        return True
+
+    def poll(self):
+        """
+        Decode everything appended since the last poll
+
+        Returns
+        -------
+        chunks : list of Curve and EventList, one per block with new data
+        """
+        chunks = []
+        if not self.read_header():
+            return chunks
+        file_size = os.fstat(self._file.fileno()).st_size
+        for name, dat in self.blocks.items():
+            if dat['magic_id'] in self._sensor_ids and (self.curves is None or name in self.curves):
+                chunk = self._read_sensor(dat, file_size)
+            elif dat['magic_id'] in self._meta1_ids and self.annotations:
+                chunk = self._read_records(dat, file_size)
+            else:
+                continue
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    def follow(self, interval=1.0, idle_timeout=None):
+        """
+        Poll every `interval` seconds and yield the chunks,
+        stop when nothing has been appended for `idle_timeout` seconds (default: never)
+        """
+        last_data = time.monotonic()
+        while True:
+            chunks = self.poll()
+            yield from chunks
+            if chunks:
+                last_data = time.monotonic()
+            elif idle_timeout is not None and time.monotonic() - last_data >= idle_timeout:
+                return
+            time.sleep(interval)
+
+    def _start(self, dat):
+        """
+        Position to continue decoding a block at, from its beginning if it is new or has moved
+        """
+        name = dat['data_name']
+        if self._addresses.get(name) != dat['adresse'] or self.positions.get(name, 0) > dat['d_end']:
+            self._addresses[name] = dat['adresse']
+            self.positions[name] = dat['d_start']
+            self._units.pop(name, None)
+        return self.positions[name]
+
+    def _read(self, position, size):
+        self._file.seek(position)
+        return self._file.read(size)
+
+    def _read_sensor(self, dat, file_size):
+        name = dat['data_name']
+        start = self._start(dat)
+        n_samples = (min(dat['d_end'], file_size) - start) // _sensor_size
+        if n_samples <= 0:
+            return None
+        data = self._read(start, n_samples * _sensor_size)
+        n_samples = len(data) // _sensor_size
+        self.positions[name] = start + n_samples * _sensor_size
+        if name not in self._units:
+            unit = codecs.decode(self._read(dat['adresse'] + 207, 15), 'iso8859-1').rstrip('\x00')
+            self._units[name] = u'°C' if unit == 'C' else unit
+        samples = np.frombuffer(data, dtype=PcRes3._sensor_dtype, count=n_samples)
+        return Curve(name, np.round(samples['volume'] / 100.0, 4), samples['value'] / PcRes3.sensor_divisor(name),
+                     unit=self._units[name], data_type='curve', run_name=dat['run_name'], magic_id=dat['magic_id'])
+
+    def _read_records(self, dat, file_size):
+        name = dat['data_name']
+        start = self._start(dat)
+        available = min(dat['d_end'], file_size) - start
+        if available < _record_size:
+            return None
+        n_records = (available - _record_size) // _record_stride + 1
+        data = self._read(start, (n_records - 1) * _record_stride + _record_size)
+        if len(data) < (n_records - 1) * _record_stride + _record_size:
+            return None
+        self.positions[name] = start + n_records * _record_stride
+        records = np.ndarray((n_records,), dtype=PcRes3._meta1_dtype, buffer=data, strides=(_record_stride,))
+        return EventList(name, np.round(records['acc_volume'], 4), raw_labels=records['label'].copy(),
+                         acc_time=records['acc_time'].copy(), data_type='annotation', run_name=dat['run_name'],
+                         magic_id=dat['magic_id'])
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Peak tables of curves: baseline correction, peak picking and trapezoidal integration.
+
+All steps work on whole arrays (segment reductions instead of loops over points), so one curve
+takes about as long as a few passes over its values and many runs can be analysed in worker processes.
+"""
+import traceback
+
+import numpy as np
+
+from .batch import LoadResult
+from .batch import _map_files
+from .batch import load_file
+from .pycorn import PcRes3
+from .utils import injection_volume
+from .utils import prepare_curve
+
+# a peak table is a structured array, pandas.DataFrame(table) turns it into a DataFrame.
+# volume: retention volume of the apex, height: baseline corrected height of the apex,
+# width: width at half height, start/end: integration bounds, area: baseline corrected area between them,
+# resolution: 1.18 * distance / sum of the widths to the previous peak (NaN for the first),
+# window: index of the event window of the peak, -1 without windows
+peak_dtype = np.dtype([('volume', 'f8'), ('height', 'f8'), ('width', 'f8'), ('start', 'f8'), ('end', 'f8'),
+                       ('area', 'f8'), ('resolution', 'f8'), ('window', 'i8')])
+
+
+def baseline(volumes, values, method='rubberband', n_segments=32):
+    """
+    Baseline of a curve
+
+    Parameters
+    ----------
+    volumes, values : arrays, volumes sorted ascending
+    method : str, optional, 'rubberband' (default): the lower convex hull of the minima of `n_segments`
+        segments with the same number of points, minima on top of peaks are skipped.
+        'segments': straight lines through all these minima, for baselines that are not convex,
+        choose the segments wider than the peaks.
+        'linear': the straight line from the first to the last point. None: no baseline (zeros)
+    n_segments : int, optional
+
+    Returns
+    -------
+    baseline : float array like values
+    """
+    volumes = np.asarray(volumes, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if method is None or len(values) == 0:
+        return np.zeros(len(values))
+    if method == 'linear':
+        if len(values) == 1 or volumes[-1] == volumes[0]:
+            return np.full(len(values), values[0])
+        return values[0] + (volumes - volumes[0]) * ((values[-1] - values[0]) / (volumes[-1] - volumes[0]))
+    if method not in ('rubberband', 'segments'):
+        raise ValueError(f"unknown baseline method {method}, use 'rubberband', 'segments', 'linear' or None")
+    n_segments = max(1, min(n_segments, len(values)))
+    size = -(-len(values) // n_segments)
+    # pad with inf to a (n_segments, size) array, the minimum of every row is the minimum of a segment
+    padded = np.full(n_segments * size, np.inf)
+    padded[:len(values)] = values
+    rows = padded.reshape(n_segments, size)
+    minima = np.argmin(rows, axis=1) + np.arange(n_segments) * size
+    minima = minima[minima < len(values)]
+    if method == 'rubberband':
+        minima = _lower_hull(volumes, values, minima)
+    return np.interp(volumes, volumes[minima], values[minima])
+
+
+def _lower_hull(volumes, values, points):
+    """
+    The points of the lower convex hull, points above the line between their neighbours are dropped until none is
+    """
+    while len(points) > 2:
+        x, y = volumes[points], values[points]
+        # cross product of (left -> point) and (left -> right), negative if the point lies above the line
+        cross = (x[1:-1] - x[:-2]) * (y[2:] - y[:-2]) - (y[1:-1] - y[:-2]) * (x[2:] - x[:-2])
+        # a point above the line between any two others is not on the hull, all of them can go at once
+        above = np.flatnonzero(cross < 0) + 1
+        if len(above) == 0:
+            break
+        points = np.delete(points, above)
+    return points
+
+
+def find_peaks(values, min_prominence=None, min_height=None):
+    """
+    Indices of the peaks of a (baseline corrected) curve
+
+    All local maxima are candidates (of a plateau its first point), a candidate less than `min_prominence`
+    above the higher of the valleys to its neighbours is merged into the neighbour across that valley,
+    until all remaining peaks stand out by at least `min_prominence`.
+
+    Parameters
+    ----------
+    values : array
+    min_prominence : float, optional, default: 1% of the range of the values
+    min_height : float, optional, drop peaks lower than this
+
+    Returns
+    -------
+    peaks : int array, indices into values, ascending
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 3:
+        return np.empty(0, dtype=np.intp)
+    if min_prominence is None:
+        min_prominence = 0.01 * (values.max() - values.min())
+    steps = np.append(np.sign(np.diff(values)), 0.0)
+    # direction of the next change from every point on, so that plateaus take the direction they are left in
+    positions = np.where(steps != 0, np.arange(n), n - 1)
+    leaving = steps[np.minimum.accumulate(positions[::-1])[::-1]]
+    peaks = np.flatnonzero((steps[:-2] > 0) & (leaving[1:-1] < 0)) + 1
+
+    while len(peaks):
+        left, right = _valleys(values, peaks)
+        heights = values[peaks]
+        limiting_left = left >= right
+        prominence = heights - np.maximum(left, right)
+        low = prominence < min_prominence
+        if not low.any():
+            break
+        # neighbour across the limiting valley, the peak is merged into it if that one is higher
+        neighbour = np.where(limiting_left, np.arange(len(peaks)) - 1, np.arange(len(peaks)) + 1)
+        has_neighbour = (neighbour >= 0) & (neighbour < len(peaks))
+        neighbour_height = values[peaks[np.clip(neighbour, 0, len(peaks) - 1)]]
+        merged = ~has_neighbour | (neighbour_height > heights) | ((neighbour_height == heights) & limiting_left)
+        drop = low & merged
+        if not drop.any():
+            break
+        peaks = peaks[~drop]
+    if min_height is not None:
+        peaks = peaks[values[peaks] >= min_height]
+    return peaks
+
+
+def _valleys(values, peaks):
+    """
+    Minimum of the values left and right of every peak, up to the neighbouring peaks or the ends
+    """
+    minima = np.minimum.reduceat(values, np.concatenate(([0], peaks)))
+    return minima[:-1], minima[1:]
+
+
+def _valley_indices(values, peaks):
+    """
+    Index of the minimum before the first peak, between every two peaks and after the last peak
+    """
+    starts = np.concatenate(([0], peaks))
+    minima = np.minimum.reduceat(values, starts)
+    lengths = np.diff(np.append(starts, len(values)))
+    positions = np.flatnonzero(values == np.repeat(minima, lengths))
+    segment = np.searchsorted(starts, positions, side='right') - 1
+    _, first = np.unique(segment, return_index=True)
+    return positions[first]
+
+
+def _segments(starts, ends):
+    """
+    All indices of the segments starts[k]..ends[k] (inclusive) concatenated, and the offset of every segment
+    """
+    lengths = ends - starts + 1
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths), offsets, lengths
+
+
+def _crossings(volumes, values, peaks, lower, upper, levels):
+    """
+    Volumes where the values fall below `levels` left and right of every peak (interpolated),
+    searched no further than the indices `lower` and `upper`
+    """
+    left_idx, offsets, lengths = _segments(lower, peaks)
+    below = np.where(values[left_idx] <= np.repeat(levels, lengths), left_idx, -1)
+    i = np.maximum.reduceat(below, offsets)
+    found = i >= 0
+    i = np.where(found, i, lower)
+    left = np.where(found, _level_volume(volumes, values, i, np.minimum(i + 1, peaks), levels), volumes[lower])
+
+    right_idx, offsets, lengths = _segments(peaks, upper)
+    below = np.where(values[right_idx] <= np.repeat(levels, lengths), right_idx, len(values))
+    j = np.minimum.reduceat(below, offsets)
+    found = j < len(values)
+    j = np.where(found, j, upper)
+    right = np.where(found, _level_volume(volumes, values, j, np.maximum(j - 1, peaks), levels), volumes[upper])
+    return left, right
+
+
+def _level_volume(volumes, values, i, j, levels):
+    """
+    Volume between points i and j at which the straight line between them has the value `levels`
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip(np.nan_to_num((levels - values[i]) / (values[j] - values[i])), 0.0, 1.0)
+    return volumes[i] + fraction * (volumes[j] - volumes[i])
+
+
+def cumulative_area(volumes, values):
+    """
+    Trapezoidal integral of the values from the first volume to every volume
+    """
+    area = np.empty(len(values))
+    area[:1] = 0.0
+    np.cumsum(0.5 * (values[1:] + values[:-1]) * np.diff(volumes), out=area[1:])
+    return area
+
+
+def window_areas(volumes, values, windows):
+    """
+    Trapezoidal area of a curve in every window, e.g. per fraction
+
+    Parameters
+    ----------
+    volumes, values : arrays, volumes sorted ascending
+    windows : array of shape (n, 2), start and end volume of every window
+
+    Returns
+    -------
+    areas : float array of length n
+    """
+    windows = np.asarray(windows, dtype=float).reshape(-1, 2)
+    area = cumulative_area(np.asarray(volumes, dtype=float), np.asarray(values, dtype=float))
+    return np.interp(windows[:, 1], volumes, area) - np.interp(windows[:, 0], volumes, area)
+
+
+def event_windows(events, end=np.inf):
+    """
+    Windows from every event to the next one, e.g. fractions or the runs after each injection
+
+    Parameters
+    ----------
+    events : EventList or array of volumes
+    end : float, optional, end of the last window
+
+    Returns
+    -------
+    windows : float array of shape (n, 2), start and end volume of every window
+    """
+    volumes = np.sort(np.asarray(getattr(events, 'volumes', events), dtype=float))
+    return np.column_stack((volumes, np.append(volumes[1:], end)))
+
+
+def peak_table(curve, baseline_method='rubberband', n_segments=32, min_prominence=None, min_height=None,
+               edge=0.01, windows=None, offset=0.0):
+    """
+    Peaks of a curve with their retention volume, height, width at half height, area and resolution
+
+    Parameters
+    ----------
+    curve : Curve or (volumes, values) tuple
+    baseline_method, n_segments : optional, see baseline()
+    min_prominence, min_height : optional, see find_peaks(), in the unit of the curve after baseline correction
+    edge : float, optional, a peak is integrated from where it rises above `edge` * height to where it falls
+        below it again, at most to the valleys to its neighbours (default: 1%)
+    windows : array of shape (n, 2), optional, e.g. event_windows(fractions): only peaks with their apex in a
+        window are kept and each is integrated within its window
+    offset : float, optional, volume subtracted from the curve, e.g. the injection volume
+
+    Returns
+    -------
+    table : structured array with dtype peak_dtype, one row per peak
+    """
+    volumes, values = (curve.volumes, curve.values) if hasattr(curve, 'volumes') else curve
+    volumes, values = prepare_curve(volumes, values, offset)
+    if len(values) < 3:
+        return np.empty(0, dtype=peak_dtype)
+    corrected = values - baseline(volumes, values, method=baseline_method, n_segments=n_segments)
+    peaks = find_peaks(corrected, min_prominence=min_prominence, min_height=min_height)
+    window = np.full(len(peaks), -1)
+    if windows is not None:
+        windows = np.asarray(windows, dtype=float).reshape(-1, 2)
+        window = np.searchsorted(windows[:, 0], volumes[peaks], side='right') - 1
+        inside = (window >= 0) & (volumes[peaks] < windows[np.maximum(window, 0), 1])
+        peaks, window = peaks[inside], window[inside]
+    if len(peaks) == 0:
+        return np.empty(0, dtype=peak_dtype)
+
+    valleys = _valley_indices(corrected, peaks)
+    lower, upper = valleys[:-1], valleys[1:]
+    heights = corrected[peaks]
+    half_left, half_right = _crossings(volumes, corrected, peaks, lower, upper, 0.5 * heights)
+    start, end = _crossings(volumes, corrected, peaks, lower, upper, edge * heights)
+    if windows is not None:
+        start = np.maximum(start, windows[window, 0])
+        end = np.minimum(end, windows[window, 1])
+    area = cumulative_area(volumes, corrected)
+
+    table = np.empty(len(peaks), dtype=peak_dtype)
+    table['volume'] = volumes[peaks]
+    table['height'] = heights
+    table['width'] = half_right - half_left
+    table['start'] = start
+    table['end'] = end
+    table['area'] = np.interp(end, volumes, area) - np.interp(start, volumes, area)
+    table['resolution'] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['resolution'][1:] = 1.18 * np.diff(table['volume']) / (table['width'][1:] + table['width'][:-1])
+    table['window'] = window
+    return table
+
+
+def run_peak_table(data, curve, chromatogram=None, windows=None, align_injection=True, **kwargs):
+    """
+    Peak table of a curve of a loaded run
+
+    Parameters
+    ----------
+    data : PcRes3 or PcUni6
+    curve : str, name of the curve, e.g. "UV 1_280" or "UV1_280nm"
+    chromatogram : str, optional, chromatogram of a zip-bundle (e.g. "Chrom.1"). Default: the first one
+    windows : str or array, optional, 'Fractions' or 'Injection' to integrate only within the windows
+        between these events, or an array of windows, see peak_table()
+    align_injection : bool, optional, volumes of zip-bundles relative to their injection mark (default).
+        res-files are always relative to the injection selected by inj_sel
+    kwargs : passed on to peak_table()
+
+    Returns
+    -------
+    table : structured array with dtype peak_dtype
+    """
+    if isinstance(data, PcRes3):
+        blocks = data
+        offset = 0.0
+    else:
+        if chromatogram is None:
+            chromatogram = next(key for key in data if data.is_decoded(key) and type(data[key]) is dict)
+        blocks = data[chromatogram]
+        offset = injection_volume(blocks) if align_injection else 0.0
+    if isinstance(windows, str):
+        # res-files call the injection marks 'Inject'
+        events = blocks.get(windows)
+        if events is None and windows == 'Injection':
+            events = blocks.get('Inject')
+        if events is None:
+            raise KeyError(f"{windows} not found in {data.file_name}")
+        windows = event_windows(np.asarray(events.volumes, dtype=float) - offset)
+    return peak_table(blocks[curve], windows=windows, offset=offset, **kwargs)
+
+
+def peak_tables(paths, curve, chromatogram=None, windows=None, align_injection=True, peak_options=None,
+                workers=None, ordered=True, **kwargs):
+    """
+    Peak tables of a curve of many runs, computed in worker processes
+
+    Only the tables are sent back from the workers, a run that fails does not stop the batch.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path, .res or .zip files
+    curve, chromatogram, windows, align_injection : see run_peak_table()
+    peak_options : dict, optional, passed on to peak_table(), e.g. dict(min_prominence=5.0)
+    workers, ordered : optional, see load_many()
+    kwargs : passed on to load_file, e.g. inj_sel
+
+    Yields
+    ------
+    result : LoadResult with the peak table as data
+    """
+    options = dict(curve=curve, chromatogram=chromatogram, windows=windows, align_injection=align_injection,
+                   peak_options=peak_options or {}, load_options=kwargs)
+    yield from _map_files(_peak_table_one, paths, options, workers=workers, ordered=ordered)
+
+
+def _peak_table_one(file_name, options):
+    """
+    Load one run and compute its peak table, runs in the worker processes
+    """
+    try:
+        return LoadResult(file_name, _file_peak_table(file_name, **options), None, None)
+    except Exception as e:
+        return LoadResult(file_name, None, e, traceback.format_exc())
+
+
+def _file_peak_table(file_name, curve, chromatogram, windows, align_injection, peak_options, load_options):
+    # events (Fractions, Injection) are always loaded with the curves
+    data = load_file(file_name, curves=[curve], chromatograms=None if chromatogram is None else [chromatogram],
+                     **load_options)
+    return run_peak_table(data, curve, chromatogram=chromatogram, windows=windows, align_injection=align_injection,
+                          **peak_options)
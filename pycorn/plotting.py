@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Plotting of loaded runs with matplotlib (imported when a plot is drawn).
+
+The x-range of a curve is found by binary search on its sorted volumes and every curve
+is downsampled to about the pixel width of the figure before it is handed to matplotlib,
+so plotting a long run costs about the same as plotting a short one.
+"""
+import numpy as np
+
+from .curves import Curve
+
+styles = {'UV': {'color': '#1919FF', 'lw': 1.6, 'ls': "-", 'alpha': 1.0},
+          'UV1_': {'color': '#1919FF', 'lw': 1.6, 'ls': "-", 'alpha': 1.0},
+          'UV2_': {'color': '#e51616', 'lw': 1.4, 'ls': "-", 'alpha': 1.0},
+          'UV3_': {'color': '#c73de6', 'lw': 1.2, 'ls': "-", 'alpha': 1.0},
+          'UV 1': {'color': '#1919FF', 'lw': 1.6, 'ls': "-", 'alpha': 1.0},
+          'UV 2': {'color': '#e51616', 'lw': 1.4, 'ls': "-", 'alpha': 1.0},
+          'UV 3': {'color': '#c73de6', 'lw': 1.2, 'ls': "-", 'alpha': 1.0},
+          'Cond': {'color': '#FF7C29', 'lw': 1.4, 'ls': "-", 'alpha': 0.75},
+          'Conc': {'color': '#0F990F', 'lw': 1.0, 'ls': "-", 'alpha': 0.75},
+          'Pres': {'color': '#C0CBBA', 'lw': 1.0, 'ls': "-", 'alpha': 0.50},
+          'Temp': {'color': '#b29375', 'lw': 1.0, 'ls': "-", 'alpha': 0.75},
+          'Inje': {'color': '#d56d9d', 'lw': 1.0, 'ls': "-", 'alpha': 0.75},
+          'pH': {'color': '#0C7F7F', 'lw': 1.0, 'ls': "-", 'alpha': 0.75}, }
+_default_style = {'color': '#404040', 'lw': 1.0, 'ls': "-", 'alpha': 0.75}
+
+
+def expander(min_val, max_val, perc):
+    """
+    expand -/+ direction of two values by a percentage of their delta
+    """
+    delta = abs(max_val - min_val)
+    x = delta * perc
+    return min_val - x, max_val + x
+
+
+def mapper(min_val, max_val, perc):
+    """
+    calculate relative position in delta min/max
+    """
+    x = abs(max_val - min_val) * perc
+    if min_val < 0:
+        return x - abs(min_val)
+    else:
+        return x + min_val
+
+
+def uv_blocks(blocks):
+    """
+    Names of the UV curves to plot (UV3_0nm etc. are left out)
+    """
+    return [name for name in blocks if name.startswith('UV') and not name.endswith('_0nm')]
+
+
+def nearest_index(volumes, volume):
+    """
+    Index of the point closest to `volume` in the sorted array `volumes`, by binary search
+    """
+    i = int(np.searchsorted(volumes, volume))
+    if i == len(volumes) or (i > 0 and volume - volumes[i - 1] <= volumes[i] - volume):
+        return i - 1
+    return i
+
+
+def x_range(volumes, x_min, x_max):
+    """
+    Slice of the sorted array `volumes` covering [x_min, x_max], including one point
+    on each side, so lines run through to the edges of the plot
+    """
+    start = max(int(np.searchsorted(volumes, x_min, side='left')) - 1, 0)
+    stop = min(int(np.searchsorted(volumes, x_max, side='right')) + 1, len(volumes))
+    return slice(start, stop)
+
+
+def fraction_marks(fractions):
+    """
+    Positions of the fraction labels: each label sits a little after its fraction mark,
+    shifted by 0.55 times the width of the fraction (the last fraction gets the width of the one before)
+
+    Returns
+    -------
+    volumes, label_positions : arrays
+    """
+    volumes = np.asarray(fractions.volumes, dtype=float)
+    if len(volumes) < 2:
+        return volumes, volumes
+    deltas = np.abs(np.diff(volumes))
+    deltas = np.append(deltas, deltas[-1])
+    return volumes, volumes + deltas * 0.55
+
+
+def downsample_minmax(x, y, n_buckets):
+    """
+    Split the points into n_buckets buckets of equal count and keep the minimum and maximum of each
+    bucket (in their original order), so peaks and spikes survive the downsampling.
+    """
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return x, y
+    bucket_size = -(-n // n_buckets)
+    n_buckets = -(-n // bucket_size)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    # all-NaN buckets only occur if y itself contains NaN, argmin/argmax then return the first point
+    filled = np.isnan(padded).all(axis=1)
+    padded[filled, 0] = 0.0
+    i_min = np.nanargmin(padded, axis=1) + offsets
+    i_max = np.nanargmax(padded, axis=1) + offsets
+    indices = np.unique(np.concatenate((i_min, i_max, [0, n - 1])))
+    return x[indices], y[indices]
+
+
+def downsample_lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keep the first and last point and from every bucket in between
+    the point spanning the largest triangle with the point kept before and the mean of the next bucket.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # the mean of every bucket, used as third point of the triangle for the bucket before
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    means_x = np.append(sums_x / counts, x[-1])
+    means_y = np.append(sums_y / counts, y[-1])
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[a] - means_x[bucket + 1]) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (means_y[bucket + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        indices[bucket + 1] = a
+    return x[indices], y[indices]
+
+
+def downsample(x, y, n_pixels, method='minmax'):
+    """
+    Reduce a curve to about two points per pixel
+
+    Parameters
+    ----------
+    x, y : arrays
+    n_pixels : int, width of the plot in pixels
+    method : str, optional, 'minmax' (default), 'lttb' or None to keep all points
+    """
+    if method is None:
+        return x, y
+    if method == 'minmax':
+        return downsample_minmax(x, y, n_pixels)
+    if method == 'lttb':
+        return downsample_lttb(x, y, 2 * n_pixels)
+    raise ValueError(f"unknown downsampling method {method}")
+
+
+def smartscale(blocks, x_min=None, x_max=None):
+    """
+    checks user input/fractions to determine scaling of x/y-axis
+
+    Parameters
+    ----------
+    blocks : dict-like with data_name: Curve/EventList, e.g. a loaded PcRes3 or PcUni6()["Chrom.1"]
+    x_min, x_max : float, optional
+
+    Returns
+    -------
+    min/max for x/y
+    """
+    uv_names = uv_blocks(blocks)
+    uv1 = blocks[uv_names[0]]
+    fractions = blocks['Fractions'] if 'Fractions' in blocks and len(blocks['Fractions'].volumes) else None
+    if x_min is not None:
+        plot_x_min = x_min
+    elif fractions is not None:
+        plot_x_min = fractions.volumes[0]
+    else:
+        plot_x_min = uv1.volumes[0]
+    if x_max:
+        plot_x_max = x_max
+    elif fractions is not None:
+        frac_x = np.asarray(fractions.volumes, dtype=float)
+        frac_delta = abs(frac_x[-1] - frac_x[-2]) if len(frac_x) > 1 else 0.0
+        plot_x_max = frac_x[-1] + frac_delta * 2  # recheck
+    else:
+        plot_x_max = uv1.volumes[-1]
+    if plot_x_min > plot_x_max:
+        print("Warning: xmin bigger than xmax - adjusting...")
+        plot_x_min = uv1.volumes[0]
+    if plot_x_max < plot_x_min:
+        print("Warning: xmax smaller than xmin - adjusting...")
+        plot_x_max = uv1.volumes[-1]
+    # optimize y_scaling
+    min_y_values = []
+    max_y_values = []
+    for name in uv_names:
+        curve = blocks[name]
+        range_min_idx = nearest_index(curve.volumes, plot_x_min)
+        range_max_idx = nearest_index(curve.volumes, plot_x_max)
+        values_in_range = curve.values[range_min_idx:range_max_idx]
+        if len(values_in_range):
+            min_y_values.append(values_in_range.min())
+            max_y_values.append(values_in_range.max())
+    if not min_y_values:
+        min_y_values, max_y_values = [uv1.values.min()], [uv1.values.max()]
+    plot_y_min, plot_y_max = expander(float(min(min_y_values)), float(max(max_y_values)), 0.085)
+    return float(plot_x_min), float(plot_x_max), plot_y_min, plot_y_max
+
+
+def plot_run(blocks, plot_file, title=None, x_min=None, x_max=None, par1='Cond', par2=None, fractions=True,
+             inject_vol=0.0, legend=True, dpi=300, downsampling='minmax', print_log=True):
+    """
+    Plot the UV curves of a run together with up to two further curves on their own y-axes,
+    the fractions and the injection mark, and save the plot to `plot_file`.
+
+    Parameters
+    ----------
+    blocks : dict-like with data_name: Curve/EventList, e.g. a loaded PcRes3 or PcUni6()["Chrom.1"]
+    plot_file : str, file name, the extension determines the file format
+    title : str, optional
+    x_min, x_max : float, optional, x-range, by default taken from the fractions or the first UV curve
+    par1, par2 : str, optional, names of the curves for the 2nd and 3rd y-axis
+    fractions : bool, optional, plot the fraction marks
+    inject_vol : float, optional, the injection mark at 0 ml is drawn if this is not 0
+    legend : bool, optional
+    dpi : int, optional
+    downsampling : str, optional, 'minmax' (default), 'lttb' or None
+    """
+    from matplotlib.ticker import AutoMinorLocator
+    import matplotlib.pyplot as plt
+    import mpl_toolkits.axisartist as AA
+    from mpl_toolkits.axes_grid1 import host_subplot
+
+    plot_x_min, plot_x_max, plot_y_min, plot_y_max = smartscale(blocks, x_min, x_max)
+    host = host_subplot(111, axes_class=AA.Axes)
+    n_pixels = int(host.get_figure().get_figwidth() * dpi)
+
+    def plot_curve(axis, curve, style):
+        volumes = curve.volumes
+        visible = x_range(volumes, plot_x_min, plot_x_max)
+        x_dat, y_dat = downsample(volumes[visible], curve.values[visible], n_pixels, downsampling)
+        if print_log:
+            print("Plotting: " + curve.name)
+        return axis.plot(x_dat, y_dat, label=curve.name, color=style['color'], ls=style['ls'], lw=style['lw'],
+                         alpha=style['alpha'])
+
+    host.set_xlabel("Elution volume (ml)")
+    host.set_ylabel("Absorbance (mAu)")
+    host.set_xlim(plot_x_min, plot_x_max)
+    host.set_ylim(plot_y_min, plot_y_max)
+    for name in uv_blocks(blocks):
+        plot_curve(host, blocks[name], styles.get(name[:4], _default_style))
+    for i, par_name in enumerate((par1, par2)):
+        if par_name is None:
+            continue
+        if not isinstance(blocks.get(par_name), Curve):
+            print(f"Warning: Data block chosen for par{i + 1} does not exist!")
+            continue
+        par = host.twinx()
+        if i == 1:
+            new_fixed_axis = par.get_grid_helper().new_fixed_axis
+            par.axis["right"] = new_fixed_axis(loc="right", axes=par, offset=(60, 0))
+            par.axis["right"].toggle(all=True)
+        par_data = blocks[par_name]
+        style = styles.get(par_name[:4], _default_style)
+        par.set_ylabel(f"{par_data.name} ({par_data.unit})", color=style['color'])
+        par.set_ylim(*expander(float(par_data.values.min()), float(par_data.values.max()), (0.085, 0.075)[i]))
+        plot_curve(par, par_data, style)
+    if fractions and 'Fractions' in blocks:
+        frac_data = blocks['Fractions']
+        frac_x, label_x = fraction_marks(frac_data)
+        frac_y_pos = mapper(host.get_ylim()[0], host.get_ylim()[1], 0.015)
+        # only the fractions in the visible range are drawn
+        visible = x_range(frac_x, plot_x_min, plot_x_max)
+        # all marks as one collection, x in data and y in axes coordinates like axvline
+        host.vlines(frac_x[visible], 0.0, 0.065, transform=host.get_xaxis_transform(), colors='r', linewidth=0.85)
+        for x_label, label in zip(label_x[visible], frac_data.labels[visible]):
+            host.text(x_label, frac_y_pos, str(label),
+                      horizontalalignment='center', verticalalignment='bottom', size=8, rotation=90)
+    if inject_vol != 0.0:
+        host.axvline(x=0, ymin=0.10, ymax=0.0, color='#FF3292', ls='-', marker='v', markevery=2, linewidth=1.5,
+                     alpha=0.85, label='Inject')
+    host.set_xlim(plot_x_min, plot_x_max)
+    if legend:
+        host.legend(fontsize=8, fancybox=True, labelspacing=0.4, loc='upper right', numpoints=1)
+    host.xaxis.set_minor_locator(AutoMinorLocator())
+    host.yaxis.set_minor_locator(AutoMinorLocator())
+    if title:
+        plt.title(title, loc='left', size=9)
+    plt.savefig(plot_file, bbox_inches='tight', dpi=dpi)
+    if print_log:
+        print("Plot saved to: " + plot_file)
+    plt.clf()
@@ -7,15 +7,19 @@ v0.18b
 """
 import codecs
 import io
+import mmap
 import os
 import struct
-import traceback
 from collections import OrderedDict
+from collections.abc import ItemsView
+from collections.abc import ValuesView
+from time import perf_counter
 from xml.etree import ElementTree
 from zipfile import ZipFile
 from zipfile import is_zipfile
 
-import xmltodict
+from .curves import Curve
+from .curves import EventList
 
 
 def return_on_failure(errors=(Exception,), default_value=None):
@@ -24,6 +28,7 @@ def return_on_failure(errors=(Exception,), default_value=None):
             try:
                 return f(*args, **kwargs)
             except errors as e:
+                import traceback
                 print(f'Error {e} on {args, kwargs}')
                 traceback.print_exc()
                 return default_value
@@ -36,9 +41,130 @@ def return_on_failure(errors=(Exception,), default_value=None):
 try_except_wrapper = return_on_failure(errors=(Exception,), default_value=None)
 
 
-class PcRes3(OrderedDict):
+class _LazyDtype:
+    """
+    Class attribute holding a numpy dtype, created on first access:
+    numpy is only imported once data is decoded, not when pycorn is imported
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.dtype = None
+
+    def __get__(self, obj, owner=None):
+        if self.dtype is None:
+            import numpy as np
+            self.dtype = np.dtype(self.spec)
+        return self.dtype
+
+
+def _restore(cls, state, items):
+    obj = cls.__new__(cls)
+    OrderedDict.__init__(obj)
+    obj.__dict__.update(state)
+    for key, value in items:
+        OrderedDict.__setitem__(obj, key, value)
+    return obj
+
+
+class _LazyDecodeMixin:
+    """
+    Mixin for the result dicts: keys listed in `_pending` are only decoded by
+    `_decode_entry` when they are first read, the result is stored in place.
+    `evict` turns a decoded entry back into a pending one to free its memory.
+
+    Attributes listed in `_not_pickled` (open files, raw file contents) are set
+    to None in pickled copies. Pending entries stay pending in the copy, unless
+    `_decode_before_pickling` is set because the copy could not decode them.
+    """
+    _not_pickled = ()
+    _decode_before_pickling = False
+
+    def __reduce__(self):
+        if self._decode_before_pickling:
+            self.decode_all()
+        state = {key: (None if key in self._not_pickled else value) for key, value in vars(self).items()}
+        return _restore, (type(self), state, list(OrderedDict.items(self)))
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key in self._pending:
+            value = self._decode_entry(key, value)
+            super().__setitem__(key, value)
+            self._pending.discard(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def __eq__(self, other):
+        # dict comparison reads the stored values directly, so decode everything first
+        for mapping in (self, other):
+            if isinstance(mapping, _LazyDecodeMixin):
+                mapping.decode_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def decode_all(self):
+        """
+        Decode all entries that are still pending
+        """
+        for key in list(self._pending):
+            self[key]
+
+    def is_decoded(self, key):
+        """
+        True if `key` exists and does not have to be decoded on access
+        """
+        return key in self and key not in self._pending
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._pending.discard(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def evict(self, key):
+        """
+        Drop the decoded data of `key`, it is decoded again on next access
+        """
+        if key in self._pending:
+            return
+        value = super().__getitem__(key)
+        super().__setitem__(key, self._evict_entry(key, value))
+        self._pending.add(key)
+
+
+class PcRes3(_LazyDecodeMixin, OrderedDict):
     """A class for holding the PyCORN/RESv3 data.
     A subclass of `dict`, with the form `data_name`: `data`.
+
+    With use_mmap=True the file is memory-mapped instead of read into memory,
+    all blocks are then decoded straight from the mapping without copying.
+    Call close() (or use the object as a context manager) to release the file.
+
+    With lazy=True, load() only reads the header and the injection points,
+    each block is decoded the first time its key is accessed.
+
+    Pass a pycorn.LoadStats as `stats` to record timings, byte and point counts of every stage.
     """
 
     # first, some magic numbers
@@ -55,18 +181,60 @@ class PcRes3(OrderedDict):
     Inject_id2 = b'\x00\x00\x01\x00\x04\x00\x47\x04'
     LogBook_id = b'\x00\x00\x01\x00\x02\x00\x01\x13'  # capital B!
 
-    def __init__(self, file_name, reduce=1, inj_sel=-1):
+    # the declarations of the header start at 686 and are 344 bytes each, the last one is LogBook
+    _header_size = 686
+    _declaration_size = 344
+    _declaration_format = "8s296s4i24x"
+
+    _not_pickled = ('raw_data', 'stats')
+    _decode_before_pickling = True
+    stats = None
+
+    # sensor data is stored as pairs of int32: accumulated volume, sensor value
+    _sensor_dtype = _LazyDtype([('volume', '<i4'), ('value', '<i4')])
+    # annotation records are 180 bytes apart: acc. time, acc. volume, label (+ 6 bytes padding)
+    _meta1_stride = 180
+    _meta1_dtype = _LazyDtype({'names': ['acc_time', 'acc_volume', 'label'],
+                             'formats': ['<f8', '<f8', 'S158'],
+                             'offsets': [0, 8, 16],
+                             'itemsize': 174})
+
+    def __init__(self, file_name, reduce=1, inj_sel=-1, as_tuples=False, use_mmap=False, lazy=False, stats=None):
         OrderedDict.__init__(self)
+        self._pending = set()
+        self.lazy = lazy
         self.file_name = file_name
         self.reduce = reduce
+        self.as_tuples = as_tuples
         self.injection_points = None
         self.inj_sel = inj_sel
         self.inject_vol = None
         self.header_read = False
         self.run_name = ''
+        self.stats = stats
 
+        start = perf_counter() if stats is not None else 0.0
         with open(self.file_name, 'rb') as f:
-            self.raw_data = f.read()
+            if use_mmap:
+                self.raw_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.raw_data = f.read()
+        if stats is not None:
+            stats.record('read', perf_counter() - start, n_bytes=len(self.raw_data),
+                         alloc_bytes=0 if use_mmap else len(self.raw_data), source=file_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Release the memory-mapped file, decoded data stays available
+        """
+        if isinstance(self.raw_data, mmap.mmap):
+            self.raw_data.close()
 
     def input_check(self, show=False):
         """
@@ -80,7 +248,7 @@ class PcRes3(OrderedDict):
 
         x = self.raw_data.find(self.RES_magic_id, 0, 16)
         y = self.raw_data.find(b'UNICORN 3.10', 16, 36)
-        z = struct.unpack("i", self.raw_data[16:20])
+        z = struct.unpack_from("i", self.raw_data, 16)
 
         if (x, y) == (0, 24):
             if show:
@@ -118,30 +286,67 @@ class PcRes3(OrderedDict):
             return
         self.header_read = True
 
+        start = perf_counter() if self.stats is not None else 0.0
         fread = self.raw_data
-        header_end = fread.find(self.LogBook_id) + 342
-        for i in range(686, header_end, 344):
-            decl = struct.unpack("8s296s4i", fread[i:i + 320])
-            full_label = codecs.decode(decl[1], 'iso8859-1').rstrip("\x00")
-            if full_label.find(':') == -1:
-                r_name = ''
-                d_name = full_label
-            else:
-                r_name = full_label[:full_label.find(':')]
-                d_name = full_label[full_label.find('_') + 1:]
-            x = dict(magic_id=decl[0],
-                     run_name=r_name,
-                     data_name=d_name,
-                     d_size=decl[2],
-                     off_next=decl[3],
-                     adresse=decl[4],
-                     off_data=decl[5],
-                     d_start=decl[4] + decl[5],
-                     d_end=decl[4] + decl[2])
+        header_end = self._declarations_end(fread) or self._header_size
+        with memoryview(fread) as view:
+            declarations = struct.iter_unpack(self._declaration_format, view[self._header_size:header_end])
+            entries = [self._declaration(decl) for decl in declarations]
+        for x in entries:
             name = x['data_name']
             dat = self.get(name, dict())
             dat.update(x)
             self[name] = dat
+        if self.stats is not None:
+            self.stats.record('header', perf_counter() - start, n_bytes=header_end - self._header_size,
+                              n_points=len(self), source=self.file_name)
+
+    @classmethod
+    def _declarations_end(cls, buffer):
+        """
+        End of the declaration table (after the LogBook entry) in `buffer`, None if it is not complete.
+        Only the magic ids at the start of each declaration are compared, as one strided array.
+        """
+        import numpy as np
+        n_declarations = (len(buffer) - cls._header_size) // cls._declaration_size
+        logbook_id = np.frombuffer(cls.LogBook_id, dtype='<u8')[0]
+        checked = 0
+        # most files have less than 64 declarations, look there first
+        for limit in (64, n_declarations):
+            limit = min(limit, n_declarations)
+            if limit <= checked:
+                continue
+            magic_ids = np.ndarray((limit - checked,), dtype='<u8', buffer=buffer,
+                                   offset=cls._header_size + checked * cls._declaration_size,
+                                   strides=(cls._declaration_size,))
+            hits = np.flatnonzero(magic_ids == logbook_id)
+            del magic_ids
+            if len(hits):
+                return cls._header_size + (checked + int(hits[0]) + 1) * cls._declaration_size
+            checked = limit
+        return None
+
+    @staticmethod
+    def _declaration(decl):
+        """
+        Header entry from an unpacked declaration (magic id, label, size, offset to next, adresse, offset to data)
+        """
+        full_label = codecs.decode(decl[1], 'iso8859-1').rstrip("\x00")
+        if full_label.find(':') == -1:
+            r_name = ''
+            d_name = full_label
+        else:
+            r_name = full_label[:full_label.find(':')]
+            d_name = full_label[full_label.find('_') + 1:]
+        return dict(magic_id=decl[0],
+                    run_name=r_name,
+                    data_name=d_name,
+                    d_size=decl[2],
+                    off_next=decl[3],
+                    adresse=decl[4],
+                    off_data=decl[5],
+                    d_start=decl[4] + decl[5],
+                    d_end=decl[4] + decl[2])
 
     def showheader(self, full=True):
         """
@@ -152,9 +357,8 @@ class PcRes3(OrderedDict):
             print("  MAGIC_ID, ENTRY_NAME, BLOCK_SIZE, OFFSET_TO_NEXT, ADRESSE, OFFSET_TO_DATA")
         else:
             print(" ENTRY_NAME, BLOCK_SIZE, OFFSET_TO_NEXT, ADRESSE, OFFSET_TO_DATA")
-        num_blocks = len(self.items())
-        for i in range(num_blocks):
-            dtp = (list(self.items()))[i][1]
+        # the header fields are present whether a block is decoded or not
+        for dtp in OrderedDict.values(self):
             if full:
                 print(" ", dtp['magic_id'], dtp['data_name'], dtp['d_size'], dtp['off_next'], dtp['adresse'],
                       dtp['off_data'])
@@ -165,54 +369,101 @@ class PcRes3(OrderedDict):
         """
         Show stored user name
         """
-        fread = self.raw_data[:512]
-        u = struct.unpack("40s", fread[118:158])
+        u = struct.unpack_from("40s", self.raw_data, 118)
         dec_u = codecs.decode(u[0], 'iso8859-1').rstrip("\x00")
         return dec_u
 
-    def dataextractor(self, dat, show=False):
+    def curve_names(self):
         """
-        Identify data type by comparing magic id, then run appropriate
-        function to extract data, update orig. dict to include new data
+        Names of all sensor/run-data blocks, taken from the header without decoding any data
+        """
+        self.readheader()
+        return [name for name, dat in OrderedDict.items(self) if self.block_type(dat) == 'curve']
+
+    @classmethod
+    def block_type(cls, dat):
+        """
+        Identify data type by comparing magic id, without decoding anything
+        Returns 'annotation', 'meta', 'curve' or None for empty/unsupported blocks
         """
         meta1 = [
-            self.Logbook_id, self.Logbook_id2,
-            self.Inject_id, self.Inject_id2,
-            self.Fractions_id, self.Fractions_id2]
-        meta2 = [self.CNotes_id, self.Methods_id]
-        sensor = [self.SensData_id, self.SensData_id2]
+            cls.Logbook_id, cls.Logbook_id2,
+            cls.Inject_id, cls.Inject_id2,
+            cls.Fractions_id, cls.Fractions_id2]
+        meta2 = [cls.CNotes_id, cls.Methods_id]
+        sensor = [cls.SensData_id, cls.SensData_id2]
         if dat['d_size'] == 0:
-            pass
+            return None
         elif dat['magic_id'] in meta1:
-            dat.update(data=self.meta1_read(dat, show=show), data_type='annotation')
-            return dat
+            return 'annotation'
         elif dat['magic_id'] in meta2:
-            dat.update(data=self.meta2_read(dat, show=show), data_type='meta')
-            return dat
+            return 'meta'
         elif dat['magic_id'] in sensor:
-            values, unit = self.sensor_read(dat, show=show)
-            dat.update(data=values, unit=unit, data_type='curve')
+            return 'curve'
+
+    def dataextractor(self, dat, show=False):
+        """
+        Identify data type by comparing magic id, then run appropriate
+        function to extract data, update orig. dict to include new data
+        """
+        data_type = self.block_type(dat)
+        if data_type == 'annotation':
+            return self.meta1_read(dat, show=show)
+        elif data_type == 'meta':
+            dat.update(data=self.meta2_read(dat, show=show), data_type=data_type)
             return dat
+        elif data_type == 'curve':
+            return self.sensor_read(dat, show=show)
+
+    @staticmethod
+    def _block_fields(dat):
+        """
+        Split a header entry into the attributes of a Curve/EventList and the remaining header fields
+        """
+        header = {key: value for key, value in dat.items()
+                  if key not in ('magic_id', 'run_name', 'data_name', 'data', 'unit', 'data_type')}
+        return dict(run_name=dat['run_name'], magic_id=dat['magic_id'], header=header)
+
+    def _decode_entry(self, name, dat):
+        return self.dataextractor(dat)
+
+    def _evict_entry(self, name, dat):
+        if isinstance(dat, (Curve, EventList)):
+            return dict(magic_id=dat.magic_id, run_name=dat.run_name, data_name=dat.name, **dat.header)
+        return {key: value for key, value in dat.items() if key not in ('data', 'unit', 'data_type')}
 
     def meta1_read(self, dat, show=False, do_it_for_inj_det=False):
         """
         Extracts meta-data/type1, Logbook, fractions and Inject marks
         for a specific datum
+        Returns an EventList, labels are decoded when they are first read
         """
         if show:
             print(f" Reading: {dat['data_name']}")
-        final_data = []
+        start = perf_counter() if self.stats is not None else 0.0
         inj_vol_to_subtract = self.inject_vol
         if do_it_for_inj_det:
             inj_vol_to_subtract = 0.0
-        for i in range(dat['d_start'], dat['d_end'], 180):
-            dp = struct.unpack("dd158s", self.raw_data[i:i + 174])
-            # acc_time = dp[0] # not used atm
-            acc_volume = round(dp[1] - inj_vol_to_subtract, 4)
-            label = (codecs.decode(dp[2], 'iso8859-1')).rstrip('\x00')
-            merged_data = acc_volume, label
-            final_data.append(merged_data)
-        return final_data
+        records = self._meta1_records(dat)
+        # copy the volumes and labels out, so the records do not keep the file buffer alive
+        acc_volume = records['acc_volume'].copy()
+        events = EventList(dat['data_name'], acc_volume, raw_labels=records['label'].copy(),
+                           acc_time=records['acc_time'].copy(), data_type='annotation',
+                           volume_offset=inj_vol_to_subtract, decimals=4, **self._block_fields(dat))
+        if self.stats is not None:
+            self.stats.record('meta1_read', perf_counter() - start, n_bytes=dat['d_size'] - dat['off_data'],
+                              n_points=len(records), alloc_bytes=2 * acc_volume.nbytes + records['label'].nbytes,
+                              source=self.file_name)
+        return events
+
+    def _meta1_records(self, dat):
+        """
+        Structured array view on all records of a meta-data/type1 block
+        """
+        import numpy as np
+        n_records = len(range(dat['d_start'], dat['d_end'], self._meta1_stride))
+        return np.ndarray((n_records,), dtype=self._meta1_dtype, buffer=self.raw_data,
+                          offset=dat['d_start'], strides=(self._meta1_stride,))
 
     def meta2_read(self, dat, show=False):
         """
@@ -220,62 +471,85 @@ class PcRes3(OrderedDict):
         """
         if show:
             print(" Reading: {0}".format(dat['data_name']))
+        t_start = perf_counter() if self.stats is not None else 0.0
         start, size = dat['d_start'], dat['d_size']
-        tmp_data = self.raw_data[start:start + size]
-        size = tmp_data.rfind(b'\n')  # declared block-size in header is always off
-        # by a few bytes, hence it is redetermined here
-        if show and size != len(tmp_data):
-            print('meta2: reevaluated size {} -> {}'.format(size, len(tmp_data)))
+        # declared block-size in header is always off by a few bytes, hence it is redetermined here
+        end = self.raw_data.rfind(b'\n', start, start + size)
+        if show and end - start != size:
+            print('meta2: reevaluated size {} -> {}'.format(size, end - start))
 
-        raw_data = codecs.decode(self.raw_data[start:start + size], 'iso8859-1')
+        with memoryview(self.raw_data) as view:
+            raw_data = codecs.decode(view[start:max(end, start)], 'iso8859-1')
         if '\r' in raw_data:
             data = raw_data
         else:
             data = raw_data.replace('\n', '\r\n')
+        if self.stats is not None:
+            self.stats.record('meta2_read', perf_counter() - t_start, n_bytes=max(end - start, 0),
+                              alloc_bytes=len(data), source=self.file_name)
         return data
 
     def sensor_read(self, dat, show=False):
         """
         extracts sensor/run-data and applies correct division
+        Returns a Curve
         """
+        start = perf_counter() if self.stats is not None else 0.0
         s_unit_dec = None
-        final_data = []
-        if "UV" in dat['data_name'] or "Cond" == dat['data_name'] or "Flow" == dat['data_name']:
-            sensor_div = 1000.0
-        elif "Pressure" in dat['data_name']:
-            sensor_div = 100.0
-        else:
-            sensor_div = 10.0
+        sensor_div = self.sensor_divisor(dat['data_name'])
         if show:
             print(" Reading: {0}".format(dat['data_name']))
 
         fread = self.raw_data
         for i in range(dat['adresse'] + 207, dat['adresse'] + 222, 15):
-            s_unit = struct.unpack("15s", fread[i:i + 15])
+            s_unit = struct.unpack_from("15s", fread, i)
             s_unit_dec = (codecs.decode(s_unit[0], 'iso8859-1')).rstrip('\x00')
             # FIX: in some files the unit for temperature reads 'C' instead of '°C'
             if s_unit_dec == 'C':
                 s_unit_dec = u'°C'
-        for i in range(dat['d_start'], dat['d_end'], 8):
-            sread = struct.unpack("ii", fread[i:i + 8])
-            data = round((sread[0] / 100.0) - self.inject_vol, 4), sread[1] / sensor_div
-            final_data.append(data)
-        return final_data[0::self.reduce], s_unit_dec
+        n_samples = len(range(dat['d_start'], dat['d_end'], 8))
+        import numpy as np
+        sread = np.frombuffer(fread, dtype=self._sensor_dtype, count=n_samples, offset=dat['d_start'])
+        # reduce before converting, so skipped samples are never touched
+        sread = sread[::self.reduce]
+        volumes = sread['volume'] / 100.0
+        values = sread['value'] / sensor_div
+        curve = Curve(dat['data_name'], volumes, values, unit=s_unit_dec, as_tuples=self.as_tuples,
+                      data_type='curve', volume_offset=self.inject_vol, decimals=4, **self._block_fields(dat))
+        if self.stats is not None:
+            self.stats.record('sensor_read', perf_counter() - start, n_bytes=n_samples * 8, n_points=len(values),
+                              alloc_bytes=volumes.nbytes + values.nbytes, source=self.file_name)
+        return curve
+
+    @staticmethod
+    def sensor_divisor(data_name):
+        """
+        Sensor values are stored as integers, divided by this they are in their unit
+        """
+        if "UV" in data_name or "Cond" == data_name or "Flow" == data_name:
+            return 1000.0
+        elif "Pressure" in data_name:
+            return 100.0
+        return 10.0
 
     def inject_det(self, show=False):
         """
         Finds injection points - required for adjusting retention volume
         """
+        import numpy as np
         inject_ids = [self.Inject_id, self.Inject_id2]
-        injections = []
+        injections = np.empty(0)
         if self.injection_points is None:
             self.injection_points = [0.0]
-            for i in self.values():
+            for i in OrderedDict.values(self):
                 if i['magic_id'] in inject_ids:
-                    injections = self.meta1_read(i, show=show, do_it_for_inj_det=True)
-        for i in injections:
-            if i[0] != 0.0:
-                self.injection_points.append(i[0])
+                    # the same log line as meta1_read(), the records are read directly without an EventList
+                    if show:
+                        print(f" Reading: {i['data_name']}")
+                    # a lazily loaded Inject block may have been decoded already
+                    volumes = i.raw_volumes if isinstance(i, EventList) else self._meta1_records(i)['acc_volume']
+                    injections = np.round(volumes, 4)
+        self.injection_points.extend(injections[injections != 0.0].tolist())
         if show:
             print(" ---- \n Injection points: \n # \t ml")
             for x, y in enumerate(self.injection_points):
@@ -286,44 +560,174 @@ class PcRes3(OrderedDict):
         extract all data and store in list
         """
         self.readheader()
-        self.run_name = self['Logbook']['run_name']
+        self.run_name = OrderedDict.__getitem__(self, 'Logbook')['run_name']
         self.inject_det()
         try:
             self.inject_vol = self.injection_points[self.inj_sel]
         except IndexError:
             print("\n WARNING - Injection point does not exist! Selected default.\n")
             self.inject_vol = self.injection_points[-1]
-        for name, dat in list(self.items()):
-            dat = self.dataextractor(dat, show=print_log)
-            if dat is not None:
-                self[name] = dat
-            else:
+        for name, dat in list(OrderedDict.items(self)):
+            if self.block_type(dat) is None:
                 del self[name]
+            elif self.lazy:
+                self._pending.add(name)
+            else:
+                self[name] = self.dataextractor(dat, show=print_log)
+
+    def select_injection(self, inj_sel):
+        """
+        Use another injection point as zero volume, nothing is decoded again:
+        the raw volumes of the decoded blocks are kept, they only get a new offset.
+
+        Example (export against every injection point):
+            for i in range(len(data.injection_points)):
+                data.select_injection(i)
+                write_csv(data, f"run_inj{i}")
+        """
+        inject_vol = self.injection_points[inj_sel]
+        self.inj_sel = inj_sel
+        self.inject_vol = inject_vol
+        # blocks still pending are decoded with the new injection volume
+        for dat in OrderedDict.values(self):
+            if isinstance(dat, (Curve, EventList)):
+                dat.set_volume_offset(inject_vol)
+
+
+class ResHeader:
+    """
+    Header of a res-file, read without loading any data: only the first bytes and the declaration
+    table are read from disk. Answers whether the file is supported, which blocks it has and who the user is.
+
+    `entries` holds the header entries by data name (as in PcRes3), `by_magic_id` the data names by magic id.
+
+    Example:
+        header = ResHeader("sample1.res")
+        if header.supported:
+            print(header.user, header.curve_names())
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self.file_size = os.fstat(f.fileno()).st_size
+            buffer = f.read(PcRes3._header_size + 64 * PcRes3._declaration_size)
+            self.magic_ok = buffer.startswith(PcRes3.RES_magic_id)
+            end = PcRes3._declarations_end(buffer) if self.magic_ok else None
+            while self.magic_ok and end is None:
+                more = f.read(len(buffer))
+                if not more:
+                    break
+                buffer += more
+                end = PcRes3._declarations_end(buffer)
+        self.version = codecs.decode(buffer[24:36], 'iso8859-1').rstrip("\x00") if self.magic_ok else None
+        self.declared_size = struct.unpack_from("i", buffer, 16)[0] if len(buffer) >= 20 else None
+        self.user = codecs.decode(buffer[118:158], 'iso8859-1').rstrip("\x00") if self.magic_ok else None
+        self.complete = end is not None
+        self.entries = OrderedDict()
+        self.by_magic_id = {}
+        if self.complete:
+            for decl in struct.iter_unpack(PcRes3._declaration_format, buffer[PcRes3._header_size:end]):
+                entry = PcRes3._declaration(decl)
+                self.entries[entry['data_name']] = entry
+                self.by_magic_id.setdefault(entry['magic_id'], []).append(entry['data_name'])
+
+    def __repr__(self):
+        return f"ResHeader({self.file_name!r}, supported={self.supported}, blocks={len(self.entries)})"
 
+    @property
+    def supported(self):
+        """
+        True for a complete UNICORN 3.10 res-file, same checks as PcRes3.input_check()
+        """
+        return (self.magic_ok and self.version == 'UNICORN 3.10' and self.declared_size == self.file_size
+                and self.complete)
+
+    @property
+    def run_name(self):
+        return self.entries['Logbook']['run_name'] if 'Logbook' in self.entries else ''
+
+    def block_type(self, name):
+        """
+        'annotation', 'meta', 'curve' or None for empty/unsupported blocks, see PcRes3.block_type()
+        """
+        return PcRes3.block_type(self.entries[name])
+
+    def curve_names(self):
+        """
+        Names of all sensor/run-data blocks
+        """
+        return [name for name in self.entries if self.block_type(name) == 'curve']
+
+
+class _XmlMembers(_LazyDecodeMixin, OrderedDict):
+    """
+    Members of a nested zip-file holding xml-data, each one is only
+    parsed by xmltodict when it is accessed
+    """
+
+    def __init__(self, members):
+        OrderedDict.__init__(self)
+        self._pending = set()
+        self._raw = {}
+        for key, value in members.items():
+            if "DataType" in key:
+                # value contains the DataType, so decode from bytes to string and remove the \r\n
+                self[key] = value.decode('utf-8').strip("\r\n")
+            elif len(value) <= 24:
+                self[key] = None
+            else:
+                self[key] = None
+                self._raw[key] = value
+                self._pending.add(key)
+
+    def _decode_entry(self, key, value):
+        return PcUni6._unpack_xml(self._raw[key])
 
-class PcUni6(OrderedDict):
+    def _evict_entry(self, key, value):
+        return None
+
+
+class PcUni6(_LazyDecodeMixin, OrderedDict):
     """
     A class for holding the pycorn/RESv6 data
     A subclass of `dict`, with the form `data_name`: `data`.
+
+    Curve data is stored as float32 arrays of shape (n, 2) with volume/amplitude pairs,
+    pass as_tuples=True to get lists of (volume, amplitude) tuples instead.
+
+    With lazy=True the bundle is only indexed by load(), each member (and nested zip)
+    is read and decoded the first time it is accessed. The bundle is kept open until close().
+
+    Pass a pycorn.LoadStats as `stats` to record timings, byte and point counts of every stage.
     """
     # for manual zip-detection
     _zip_magic_start = b'\x50\x4B\x03\x04\x2D\x00\x00\x00\x08'
     _zip_magic_end = b'\x50\x4B\x05\x06\x00\x00\x00\x00'
 
+    _not_pickled = ('_zip', 'stats')
+    stats = None
+
     # hack to get pycorn-bin to move on
     _sens_data_id = 0
     _sens_data_id2 = 0
     _fractions_id = 0
     _fractions_id2 = 0
 
-    def __init__(self, inp_file):
+    def __init__(self, inp_file, as_tuples=False, lazy=False, stats=None):
         OrderedDict.__init__(self)
+        self._pending = set()
+        self._zip = None
         self.file_name = inp_file
+        self.as_tuples = as_tuples
+        self.lazy = lazy
         self._inject_vol = 0.0
         self._run_name = 'blank'
         self._date = None
         self._loaded = False
+        self._chrom_info = {}
         self.chrom_id = None
+        self.stats = stats
 
     def load_all_xml(self):
         """
@@ -331,15 +735,121 @@ class PcUni6(OrderedDict):
         """
         if self._loaded is False:
             self.load(print_log=False)
-        xml_keys_to_be_parsed = [key for key in self.keys() if (".Xml" in key and "dict" not in key)]
-        for key in xml_keys_to_be_parsed:
+        for key in self.chromatogram_keys():
             self._xml_parse(key, print_log=False)
         self.clean_up()
 
+    def load_curves(self, curves=None, chromatograms=None, print_log=False):
+        """
+        Load only selected curves into the res3-like dict created by load_all_xml().
+        The curve names are mapped to their data files via Chrom.#.Xml first, only the
+        Chrom.#_#_True members of the selected curves are decompressed and decoded.
+        Event curves (Fractions, Injection, ...) are always included.
+
+        Parameters
+        ----------
+        curves : list, optional, curve names e.g. ["UV 1_280", "Cond"]. Default: all curves
+        chromatograms : list, optional, chromatogram names e.g. ["Chrom.1"]. Default: all chromatograms
+        print_log : bool, optional
+
+        """
+        if self._loaded is False:
+            self._loaded = True
+            self._index_bundle(print_log=print_log)
+        for key in self.chromatogram_keys():
+            if chromatograms is None or key.replace(".Xml", "") in chromatograms:
+                self._xml_parse(key, print_log=print_log, curves=curves)
+        self.clean_up()
+        if not self.lazy:
+            self.close()
+
+    def chromatogram_keys(self):
+        """
+        Names of the Chrom.#.Xml members of a loaded bundle
+        """
+        return [key for key in self.keys() if (".Xml" in key and "dict" not in key)]
+
+    def curve_index(self, chrom_name):
+        """
+        Map the curve names of a chromatogram to the member holding their data points.
+        Only Chrom.#.Xml is read, no curve data is decoded.
+
+        Parameters
+        ----------
+        chrom_name : str, name of the chromatogram, e.g. "Chrom.1.Xml"
+
+        Returns
+        -------
+        index : OrderedDict, curve name: data file name
+        """
+        info = self._chromatogram_info(chrom_name)
+        return OrderedDict((curve['name'], curve['data_file']) for curve in info['curves'])
+
+    def _chromatogram_info(self, chrom_name):
+        """
+        Scan results of a Chrom.#.Xml, every chromatogram is only parsed once
+        """
+        if chrom_name not in self._chrom_info:
+            xml_data = self[chrom_name]
+            start = perf_counter() if self.stats is not None else 0.0
+            self._chrom_info[chrom_name] = self._scan_chromatogram(xml_data)
+            if self.stats is not None:
+                self.stats.record('xml_scan', perf_counter() - start, n_bytes=len(xml_data), source=self.file_name)
+        return self._chrom_info[chrom_name]
+
+    @staticmethod
+    def _scan_chromatogram(xml_data):
+        """
+        Extract chromatogram ID, column volume, curves and event curves from a Chrom.#.Xml
+        in one incremental pass. Processed elements are discarded right away and parsing
+        stops as soon as everything needed has been seen.
+
+        Returns
+        -------
+        info : dict with chrom_id, column_vol and lists of dicts for curves and events
+        """
+        info = {'chrom_id': None, 'column_vol': None, 'curves': [], 'events': []}
+        required = {'ChromatogramID', 'Curves', 'EventCurves'}
+        path = []
+        for event, elem in ElementTree.iterparse(io.BytesIO(xml_data), events=('start', 'end')):
+            if event == 'start':
+                path.append(elem.tag)
+                continue
+            path.pop()
+            parent = path[-1] if path else None
+            if len(path) == 1:
+                required.discard(elem.tag)
+                if elem.tag == 'ChromatogramID':
+                    info['chrom_id'] = elem.text
+                elem.clear()
+                if not required:
+                    break
+            elif len(path) == 2 and parent == 'Curves':
+                info['curves'].append({'data_type': elem.attrib['CurveDataType'],
+                                       'name': elem.find('Name').text,
+                                       'data_file': elem.find('CurvePoints')[0][1].text,
+                                       'unit': elem.find('AmplitudeUnit').text})
+                elem.clear()
+            elif len(path) == 2 and parent == 'EventCurves':
+                if len(info['events']) == 2:
+                    info['column_vol'] = elem[10].text
+                e_list = elem.find('Events')
+                info['events'].append({'name': elem.find('Name').text,
+                                       'is_original': elem.find('IsOriginalData').text,
+                                       'volumes': [float(e.find('EventVolume').text) for e in e_list],
+                                       'labels': [e.find('EventText').text for e in e_list]})
+                elem.clear()
+        return info
+
     @property
     def date(self):
         if self._date is None:
-            root = ElementTree.fromstring(self["Result.xml"])
+            if "Result.xml" in self:
+                result_xml = self["Result.xml"]
+            else:
+                with ZipFile(self.file_name) as input_zip:
+                    result_xml = input_zip.read("Result.xml")
+            root = ElementTree.fromstring(result_xml)
             date = root.find(".//Created").text
             self._date = date[:10]
 
@@ -354,28 +864,24 @@ class PcUni6(OrderedDict):
         udata.load()
         x = udata['Chrom.1_2_True']['CoordinateData.Volumes']
         y = udata['Chrom.1_2_True']['CoordinateData.Amplitudes']
+
+        In lazy mode only the central directory of the bundle is read here,
+        members are decompressed and decoded when they are first accessed.
         """
         self._loaded = True
-        with open(self.file_name, 'rb') as f:
-            input_zip = ZipFile(f)
-            zip_data = self._zip2dict(input_zip)
-            self.update(zip_data)
+        if self.lazy:
+            self._index_bundle(print_log=print_log)
+            return
+
+        with ZipFile(self.file_name) as input_zip:
             supported_keys = []
             unsupported_keys = []
-            for key in zip_data.keys():
-                tmp_raw = io.BytesIO(input_zip.read(key))
-
-                tmp_raw = self._strip_nonstandard_zeros(tmp_raw)
-
-                if not is_zipfile(tmp_raw):
+            for key in input_zip.NameToInfo:
+                self[key] = self._read_member(input_zip, key)
+                if isinstance(self[key], dict):
+                    supported_keys.append(key)
+                else:
                     unsupported_keys.append(key)
-                    continue
-
-                x = {key: self._zip2dict(ZipFile(tmp_raw))}
-
-                self.update(x)
-
-                supported_keys.append(key)
 
             if print_log:
                 print("Loaded " + self.file_name + " into memory")
@@ -385,32 +891,111 @@ class PcUni6(OrderedDict):
                 print("\n-Not supported-")
                 for key in unsupported_keys:
                     print(" " + key)
-        # filter out data we can not handle
-        keys_with_array_data = []
-        keys_with_xml_data = []
-        for key in self.keys():
-            if "True" in key and "Xml" not in key:
-                keys_with_array_data.append(key)
-            else:
-                keys_with_xml_data.append(key)
-        if print_log:
-            print("\nFiles to process:")
-            for key in keys_with_array_data:
-                print(" " + key)
+                print("\nFiles processed:")
+                for key in supported_keys:
+                    if "True" in key and "Xml" not in key:
+                        print(" " + key)
 
-        self_keys = list(self.keys())
-        for key in self_keys:
-            data_entry = self[key]
+        # the xmltodict-versions of the xml members are only built when they are accessed
+        for key in list(self.keys()):
             if "Xml" in key:
-                self[key + "_dict"] = self._unpack_xml(data_entry, end_index=len(data_entry))
-            elif type(data_entry) is dict:
-                self[key] = self._unpack_dict_data(data_entry, key)
-            else:
-                pass
+                self[key + "_dict"] = None
+                self._pending.add(key + "_dict")
 
         if print_log:
             print("Finished decoding x/y-data!")
 
+    def _index_bundle(self, print_log=False):
+        """
+        Read the central directory of the bundle, all members are added as pending entries
+        """
+        self._zip = ZipFile(self.file_name)
+        for key in self._zip.NameToInfo:
+            self[key] = None
+            self._pending.add(key)
+        for key in [key for key in self.keys() if "Xml" in key]:
+            self[key + "_dict"] = None
+            self._pending.add(key + "_dict")
+        if print_log:
+            print("Indexed " + self.file_name)
+
+    def _read_member(self, input_zip, key):
+        """
+        Read a single member of the bundle, nested zip-files are unpacked and decoded into dicts
+        """
+        stats = self.stats
+        if stats is None:
+            raw = input_zip.read(key)
+            tmp_raw = self._strip_nonstandard_zeros(io.BytesIO(raw))
+            if not is_zipfile(tmp_raw):
+                return raw
+            return self._unpack_dict_data(self._zip2dict(ZipFile(tmp_raw)), key)
+
+        start = perf_counter()
+        raw = input_zip.read(key)
+        stats.record('zip_read', perf_counter() - start, n_bytes=input_zip.getinfo(key).compress_size,
+                     alloc_bytes=len(raw), source=self.file_name)
+        start = perf_counter()
+        tmp_raw = self._strip_nonstandard_zeros(io.BytesIO(raw))
+        is_zip = is_zipfile(tmp_raw)
+        stripped = tmp_raw.seek(0, io.SEEK_END)
+        stats.record('strip_zeros', perf_counter() - start, n_bytes=len(raw),
+                     alloc_bytes=stripped if stripped != len(raw) else 0, source=self.file_name)
+        if not is_zip:
+            return raw
+        start = perf_counter()
+        members = self._zip2dict(ZipFile(tmp_raw))
+        n_bytes = sum(len(value) for value in members.values())
+        stats.record('nested_unzip', perf_counter() - start, n_bytes=stripped, alloc_bytes=n_bytes,
+                     source=self.file_name)
+        start = perf_counter()
+        data = self._unpack_dict_data(members, key)
+        import numpy as np
+        # dict.values(), so xml members are not parsed just to be counted
+        n_points = 0 if data is None else sum(len(value) for value in dict.values(data)
+                                              if isinstance(value, np.ndarray))
+        stats.record('unpack', perf_counter() - start, n_bytes=n_bytes, n_points=n_points, source=self.file_name)
+        return data
+
+    def _read_from_bundle(self, key):
+        """
+        Read a single member, re-opening the bundle if it has been closed
+        """
+        if self._zip is not None:
+            return self._read_member(self._zip, key)
+        with ZipFile(self.file_name) as input_zip:
+            return self._read_member(input_zip, key)
+
+    def _decode_entry(self, key, value):
+        if key.endswith("_dict"):
+            xml_key = key[:-len("_dict")]
+            # the xml member itself may already be removed by clean_up()
+            data_entry = self[xml_key] if xml_key in self else self._read_from_bundle(xml_key)
+            start = perf_counter() if self.stats is not None else 0.0
+            xml_dict = self._unpack_xml(data_entry, end_index=len(data_entry))
+            if self.stats is not None:
+                self.stats.record('xmltodict', perf_counter() - start, n_bytes=len(data_entry), source=self.file_name)
+            return xml_dict
+        return self._read_from_bundle(key)
+
+    def _evict_entry(self, key, value):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the bundle kept open in lazy mode, decoded data stays available.
+        Members that are still pending are read by re-opening the bundle.
+        """
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
     def clean_up(self):
         """
         deletes everything and just keeps relevant run-data
@@ -419,22 +1004,19 @@ class PcUni6(OrderedDict):
         manifest = ElementTree.fromstring(self['Manifest.xml'])
         for i in range(len(manifest)):
             file_name = manifest[i][0].text
-            self.pop(file_name)
-        self.pop('Manifest.xml')
+            del self[file_name]
+        del self['Manifest.xml']
 
     @try_except_wrapper
     def _unpack_dict_data(self, data_entry, key):
+        if "True" not in key or "Xml" in key:
+            return _XmlMembers(data_entry)
         for sub_key, sub_value in data_entry.items():
             if "DataType" in sub_key:
                 # value contains the DataType, so decode from bytes to string and remove the \r\n
                 processed_sub_value = sub_value.decode('utf-8').strip("\r\n")
-            elif "True" in key and "Xml" not in key:
-                processed_sub_value = self._unpacker(sub_value)
             else:
-                if len(sub_value) <= 24:
-                    processed_sub_value = None
-                else:
-                    processed_sub_value = self._unpack_xml(sub_value)
+                processed_sub_value = self._unpacker(sub_value)
             data_entry[sub_key] = processed_sub_value
         return data_entry
 
@@ -476,11 +1058,10 @@ class PcUni6(OrderedDict):
     def _unpacker(inp):
         """
         input = data block
-        output = list of values
+        output = float32 array of values, a view on the data block
         """
-        inp_trunc = inp[47:-49]
-        values = [x[0] for x in struct.iter_unpack("<f", inp_trunc)]
-        return values
+        import numpy as np
+        return np.frombuffer(memoryview(inp)[47:-49], dtype='<f4')
 
     @staticmethod
     @try_except_wrapper
@@ -492,85 +1073,80 @@ class PcUni6(OrderedDict):
 
         input_truncated = inp[start_index:end_index]
         input_decoded = input_truncated.decode()
+        import xmltodict
         xml_dict = xmltodict.parse(input_decoded)
         return xml_dict
 
-    def _xml_parse(self, chrom_name, print_log=False):
+    def _xml_parse(self, chrom_name, print_log=False, curves=None):
         """
         Parse parts of the Chrom.1.Xml and create a res3-like dict
         Parameters
         ----------
         chrom_name : str, name of the chromatogram to parse
         print_log : bool, optional
+        curves : list, optional, only decode the curves with these names
 
         """
+        for _ in self._iter_xml_parse(chrom_name, print_log=print_log, curves=curves):
+            pass
+
+    def _iter_xml_parse(self, chrom_name, print_log=False, curves=None):
+        """
+        Same as _xml_parse(), but yields every EventList and Curve as soon as it is decoded
+        """
+        import numpy as np
+        start = perf_counter() if self.stats is not None else 0.0
         chrom_key = chrom_name.replace(".Xml", "")
         self[chrom_key] = {}
-        tree = ElementTree.fromstring(self[chrom_name])
-        mc = tree.find('Curves')
-        me = tree.find('EventCurves')
-        id = tree.find('ChromatogramID').text
-
-        col_vol = me[2][10].text
-        # print(id)
-        # print(tree.tag)
-        # print(tree.attrib)
-        event_dict = {}
-        for i in range(len(me)):
+        info = self._chromatogram_info(chrom_name)
+        id = info['chrom_id']
+        col_vol = info['column_vol']
+        for event_curve in info['events']:
             magic_id = self._sens_data_id
-            # e_type = me[i].attrib['EventCurveType']
-            e_name = me[i].find('Name').text
+            e_name = event_curve['name']
             if e_name == 'Fraction':
                 e_name = 'Fractions'  # another hack for pycorn-bin
-            e_orig = me[i].find('IsOriginalData').text
-            e_list = me[i].find('Events')
-            e_data = []
-            for e in range(len(e_list)):
-                e_vol = float(e_list[e].find('EventVolume').text)
-                e_txt = e_list[e].find('EventText').text
-                e_data.append((e_vol, e_txt))
+            e_orig = event_curve['is_original']
             if e_orig == "false":
                 print("not added - not orig data")
             if e_orig == "true":
-                # print("added - orig data")
-                x = {'run_name': chrom_name, 'data': e_data, 'data_name': e_name, 'magic_id': magic_id, 'chrom_id': id, 'column_vol': col_vol}
-                event_dict.update({e_name: x})
-        self[chrom_key].update(event_dict)
-        chrom_dict = {}
-        for i in range(len(mc)):
-            d_type = mc[i].attrib['CurveDataType']
-            d_name = mc[i].find('Name').text
-            d_fname = mc[i].find('CurvePoints')[0][1].text
-            d_unit = mc[i].find('AmplitudeUnit').text
+                x = EventList(e_name, np.array(event_curve['volumes'], dtype=float), labels=event_curve['labels'],
+                              run_name=chrom_name, data_type='annotation', magic_id=magic_id, chrom_id=id,
+                              column_vol=col_vol)
+                self[chrom_key][e_name] = x
+                yield x
+        total_points = 0
+        for curve in info['curves']:
+            d_type = curve['data_type']
+            d_name = curve['name']
+            if curves is not None and d_name not in curves:
+                continue
+            d_fname = curve['data_file']
+            d_unit = curve['unit']
             magic_id = self._sens_data_id
             try:
-
                 x_dat = self[d_fname]['CoordinateData.Volumes']
                 y_dat = self[d_fname]['CoordinateData.Amplitudes']
-                # if d_name == "Injection":
-                #     print(x_dat, 12)
-                #     x_dat.append(id)
-                #     print(d_name)
-                #     print(x_dat, 12)
-                #     y_dat.append("ChromID")
-                # print(type(x_dat))
-                zdata = list(zip(x_dat, y_dat))
+                n_points = min(len(x_dat), len(y_dat))
                 if d_name == "UV cell path length":
                     d_name = "xUV cell path length"  # hack to prevent pycorn-bin from picking this up
 
-                x = {'run_name': chrom_name, 'data': zdata, 'unit': d_unit, 'data_name': d_name, 'data_type': d_type,
-                     'magic_id': magic_id, 'chrom_id': id, 'column_vol': col_vol}
-                chrom_dict.update({d_name: x})
+                x = Curve(d_name, x_dat[:n_points], y_dat[:n_points], unit=d_unit, as_tuples=self.as_tuples,
+                          run_name=chrom_name, data_type=d_type, magic_id=magic_id, chrom_id=id, column_vol=col_vol)
             except KeyError as e:
                 print("not parsing", e)
                 # don't deal with data that does not make sense atm
                 # orig2.zip contains UV-blocks that are (edited) copies of
                 # original UV-trace but they dont have the volume data
+            else:
+                self[chrom_key][d_name] = x
+                total_points += len(x.values)
+                yield x
             if print_log:
                 print("---")
                 print(d_type)
                 print(d_name)
                 print(d_fname)
                 print(d_unit)
-        # chrom_dict.update({'ChromatogramID': id})
-        self[chrom_key].update(chrom_dict)
+        if self.stats is not None:
+            self.stats.record('xml_parse', perf_counter() - start, n_points=total_points, source=self.file_name)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Many runs resampled onto one volume grid, as a dense runs x curves x points array.
+"""
+import os
+import traceback
+from collections import namedtuple
+
+import numpy as np
+
+from .batch import LoadResult
+from .batch import _map_files
+from .batch import load_file
+from .curves import Curve
+from .pycorn import PcRes3
+from .utils import injection_volume
+from .utils import resample_curves
+
+RunStack = namedtuple('RunStack', ['values', 'grid', 'grid_unit', 'paths', 'curves', 'units', 'column_volumes',
+                                   'injection_volumes', 'errors'])
+RunStack.__doc__ = """
+Runs resampled onto a common grid: `values[run, curve, point]` is the value of curves[curve] of paths[run]
+at grid[point] (in ml or column volumes, see grid_unit). Runs that failed to load, and curves a run
+does not have, are NaN. `errors` maps the index of each failed run to its exception.
+`column_volumes` and `injection_volumes` (in ml) are NaN where unknown.
+"""
+
+
+def stack_runs(paths, curves, grid, grid_unit='ml', chromatogram=None, method='linear', align_injection=True,
+               workers=None, out=None, dtype=np.float64, **kwargs):
+    """
+    Load many runs in parallel and resample their curves onto a common grid
+
+    Every run is loaded and resampled in a worker process, only its resampled values are sent back
+    and written into the output array, so memory is bounded by the output (which can be a file on disk).
+
+    Parameters
+    ----------
+    paths : list of str or Path, .res or .zip files
+    curves : list of str, names of the curves, e.g. ["UV 1_280", "Cond"]
+    grid : array, or (start, stop, n_points) for an evenly spaced grid
+    grid_unit : str, optional, 'ml' (default) or 'CV': the grid is in column volumes,
+        every run is scaled by its own column volume (UNICORN >= 6 only)
+    chromatogram : str, optional, chromatogram of the zip-bundles to use. Default: the first one
+    method : str, optional, resampling method, see pycorn.utils.resample()
+    align_injection : bool, optional, volumes of zip-bundles relative to their injection mark (default).
+        res-files are always relative to the injection selected by inj_sel
+    workers : int, optional, number of worker processes, see load_many()
+    out : array or str, optional, array of shape (len(paths), len(curves), len(grid)) to write into,
+        or the name of a .npy file that is created and memory-mapped. Default: a new array
+    dtype : optional, dtype of a newly created output array
+    kwargs : passed on to load_file, e.g. reduce or inj_sel
+
+    Returns
+    -------
+    stack : RunStack
+    """
+    paths = list(paths)
+    if isinstance(grid, tuple):
+        grid = np.linspace(*grid)
+    grid = np.asarray(grid, dtype=float)
+    if grid_unit not in ('ml', 'CV'):
+        raise ValueError(f"unknown grid unit {grid_unit}, use 'ml' or 'CV'")
+    shape = (len(paths), len(curves), len(grid))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif isinstance(out, (str, os.PathLike)):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    elif out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+    units = [None] * len(curves)
+    column_volumes = np.full(len(paths), np.nan)
+    injection_volumes = np.full(len(paths), np.nan)
+    errors = {}
+    options = dict(curves=list(curves), grid=grid, grid_unit=grid_unit, chromatogram=chromatogram, method=method,
+                   align_injection=align_injection, load_options=kwargs)
+    for result in _map_files(_stack_one, enumerate(paths), options, workers=workers, ordered=False):
+        i, _ = result.path
+        if result.error is not None:
+            out[i] = np.nan
+            errors[i] = result.error
+            continue
+        values, run_units, column_volumes[i], injection_volumes[i] = result.data
+        out[i] = values
+        units = [unit if unit is not None else run_unit for unit, run_unit in zip(units, run_units)]
+    if isinstance(out, np.memmap):
+        out.flush()
+    return RunStack(out, grid, grid_unit, paths, list(curves), units, column_volumes, injection_volumes, errors)
+
+
+def _stack_one(item, options):
+    """
+    Load one run and resample it, runs in the worker processes
+    """
+    try:
+        return LoadResult(item, _resample_run(item[1], **options), None, None)
+    except Exception as e:
+        return LoadResult(item, None, e, traceback.format_exc())
+
+
+def _resample_run(file_name, curves, grid, grid_unit, chromatogram, method, align_injection, load_options):
+    data = load_file(file_name, curves=curves, chromatograms=None if chromatogram is None else [chromatogram],
+                     **load_options)
+    if isinstance(data, PcRes3):
+        blocks = data
+        injection = data.inject_vol
+        offset = 0.0
+    else:
+        chromatograms = [key for key in data if data.is_decoded(key) and type(data[key]) is dict]
+        if chromatogram is None:
+            chromatogram = chromatograms[0]
+        blocks = data[chromatogram]
+        injection = offset = injection_volume(blocks) if align_injection else 0.0
+    found = [name for name in curves if isinstance(blocks.get(name), Curve)]
+    column_vol = next((blocks[name].column_vol for name in found if blocks[name].column_vol is not None), None)
+    column_vol = np.nan if column_vol is None else float(column_vol)
+    run_grid = grid
+    if grid_unit == 'CV':
+        if not column_vol > 0:
+            raise ValueError(f"{file_name} has no column volume, a grid in CV is not possible")
+        run_grid = grid * column_vol
+
+    values = np.full((len(curves), len(grid)), np.nan)
+    resampled = resample_curves([blocks[name] for name in found], run_grid, method=method, offsets=offset)
+    values[[curves.index(name) for name in found]] = resampled
+    units = [blocks[name].unit if name in found else None for name in curves]
+    return values, units, column_vol, injection
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage statistics of loading result files.
+
+Pass a LoadStats to PcRes3/PcUni6 (or load_file/load_many) as `stats` to record how much time,
+how many bytes and points and how much memory each decoding stage takes. Without it nothing is measured.
+"""
+from collections import OrderedDict
+
+_fields = ('calls', 'seconds', 'bytes', 'points', 'alloc_bytes')
+
+
+class LoadStats:
+    """
+    Totals per stage, e.g. 'zip_read', 'nested_unzip', 'unpack' or 'sensor_read':
+    number of calls, seconds, bytes read, points decoded and bytes allocated for the decoded arrays.
+    Stages can contain others, e.g. 'xml_parse' includes the reads of members it decodes lazily.
+
+    Every record is also passed to `callback(stage, record)` (record is a dict with the fields above
+    for this call and the file name as 'source') and logged at DEBUG level to `log`, if given,
+    e.g. LoadStats(log=logging.getLogger("pycorn")).
+
+    Example:
+        stats = LoadStats()
+        data = PcUni6("sample.zip", stats=stats)
+        data.load_all_xml()
+        print(stats.summary())
+    """
+
+    def __init__(self, callback=None, log=None):
+        self.stages = OrderedDict()
+        self.callback = callback
+        self.log = log
+
+    def record(self, stage, seconds, n_bytes=0, n_points=0, alloc_bytes=0, source=None):
+        """
+        Add one call of a stage
+        """
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = dict.fromkeys(_fields, 0)
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['bytes'] += n_bytes
+        totals['points'] += n_points
+        totals['alloc_bytes'] += alloc_bytes
+        if self.callback is not None:
+            self.callback(stage, dict(calls=1, seconds=seconds, bytes=n_bytes, points=n_points,
+                                      alloc_bytes=alloc_bytes, source=source))
+        if self.log is not None:
+            self.log.debug("%s %s: %.6f s, %d bytes, %d points, %d bytes allocated", source, stage, seconds,
+                           n_bytes, n_points, alloc_bytes)
+
+    def merge(self, other):
+        """
+        Add the totals of another LoadStats, e.g. of another file, callbacks are not called
+        """
+        for stage, totals in other.stages.items():
+            own = self.stages.setdefault(stage, dict.fromkeys(_fields, 0))
+            for field in _fields:
+                own[field] += totals[field]
+        return self
+
+    def as_dict(self):
+        """
+        Totals as dict of dicts, stage: {calls, seconds, bytes, points, alloc_bytes}
+        """
+        return {stage: dict(totals) for stage, totals in self.stages.items()}
+
+    def summary(self):
+        """
+        Totals as a table, one line per stage
+        """
+        lines = [f"{'stage':16s} {'calls':>7s} {'seconds':>10s} {'MB':>10s} {'points':>12s} {'alloc. MB':>10s}"]
+        for stage, totals in self.stages.items():
+            lines.append(f"{stage:16s} {totals['calls']:7d} {totals['seconds']:10.4f} {totals['bytes'] / 2 ** 20:10.2f}"
+                         f" {totals['points']:12d} {totals['alloc_bytes'] / 2 ** 20:10.2f}")
+        return "\n".join(lines)
+
+    def __getstate__(self):
+        # callbacks and loggers stay in the process they were set up in
+        return {'stages': self.stages, 'callback': None, 'log': None}
+
+    def __repr__(self):
+        return f"LoadStats({', '.join(self.stages)})"
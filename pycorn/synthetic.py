@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Generators for synthetic result files, for tests and benchmarks.
+
+write_res3() writes UNICORN 3.10 .res files following docs/RES_files_layout.txt, write_uni6() writes
+UNICORN 6+ zip-bundles with one nested Chrom.#_#_True zip per curve. Both scale from a few thousand to
+tens of millions of points and from 1 to 50 (or more) curves; the curves are generated one at a time,
+so memory stays at about one curve.
+"""
+import io
+import struct
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED
+from zipfile import ZipFile
+
+import numpy as np
+
+from .pycorn import PcRes3
+
+# name, unit of the first res-file sensors, further sensors are called "Sensor #"
+_res3_sensors = [('UV1_280nm', 'mAU'), ('Cond', 'mS/cm'), ('pH', 'pH'), ('Pressure', 'MPa'), ('Temp', 'C'),
+                 ('Conc', '%B'), ('Flow', 'ml/min'), ('UV2_260nm', 'mAU'), ('UV3_215nm', 'mAU')]
+# name, CurveDataType, unit of the first bundle curves, further curves are called "Curve #"
+_uni6_curves = [('UV 1_280', 'UV', 'mAU'), ('Cond', 'Conductivity', 'mS/cm'), ('pH', 'pH', 'pH'),
+                ('System pressure', 'Pressure', 'MPa'), ('Cond temp', 'Temperature', '°C'),
+                ('Conc B', 'Concentration', '%'), ('System flow', 'Flow', 'ml/min'), ('UV 2_260', 'UV', 'mAU'),
+                ('UV 3_215', 'UV', 'mAU')]
+
+_block_meta_size = 240
+_sensor_marker = b'\x06\x00\x02\x00\x01\x00\x4E\x00'
+_meta1_marker = b'\x06\x00\x06\x00\x01\x00\x4E\x00'
+# .NET BinaryFormatter header of a float[] (System.Single[]), followed by the count and the primitive type
+_array_header = b'\x00\x01\x00\x00\x00\xff\xff\xff\xff\x01\x00\x00\x00\x00\x00\x00\x00\x0f\x01\x00\x00\x00'
+
+
+def curve_signal(n_points, curve=0, seed=0):
+    """
+    A chromatogram-like trace: a few Gaussian peaks on a drifting baseline plus noise
+
+    Parameters
+    ----------
+    n_points : int
+    curve : int, optional, number of the curve, different curves get different peaks
+    seed : int, optional
+
+    Returns
+    -------
+    values : float64 array
+    """
+    rng = np.random.default_rng([seed, curve])
+    x = np.linspace(0.0, 1.0, n_points)
+    values = 5.0 * x + rng.normal(0.0, 0.5, n_points)
+    for position, width, height in zip(rng.uniform(0.1, 0.9, 3), rng.uniform(0.005, 0.03, 3),
+                                       rng.uniform(50.0, 1500.0, 3)):
+        values += height * np.exp(-0.5 * ((x - position) / width) ** 2)
+    return values
+
+
+def res3_curve_names(n_curves):
+    """
+    Names and units of the sensors written by write_res3()
+    """
+    return (_res3_sensors + [(f"Sensor{i}", 'AU') for i in range(len(_res3_sensors), n_curves)])[:n_curves]
+
+
+def uni6_curve_names(n_curves):
+    """
+    Names, data types and units of the curves written by write_uni6()
+    """
+    return (_uni6_curves + [(f"Curve {i}", 'Other', 'AU') for i in range(len(_uni6_curves), n_curves)])[:n_curves]
+
+
+def write_res3(file_name, n_points=10000, n_curves=4, run_name='Manual Run 1', n_fractions=10, n_logbook=20,
+               injections=(0.25,), user='synthetic', seed=0):
+    """
+    Write a synthetic UNICORN 3.10 res-file
+
+    Parameters
+    ----------
+    file_name : str or Path
+    n_points : int, optional, points per sensor, 0.01 ml apart
+    n_curves : int, optional, number of sensors, see res3_curve_names()
+    run_name : str, optional, must not contain '_'
+    n_fractions : int, optional, fractions evenly spread over the run, the last one is "Waste"
+    n_logbook : int, optional, number of logbook entries
+    injections : list of float, optional, injection marks as fractions of the run volume
+    user : str, optional
+    seed : int, optional
+
+    Returns
+    -------
+    file_name
+    """
+    total_volume = n_points / 100.0
+    blocks = [(PcRes3.Methods_id, 'Methods', 'meta2',
+               f"Method: synthetic\n{n_points} points, {n_curves} curves\n".encode('iso8859-1'))]
+    blocks.append((PcRes3.Logbook_id, 'Logbook', 'meta1',
+                   _meta1_block(np.linspace(0.0, total_volume, n_logbook), [f"Event {i}" for i in range(n_logbook)])))
+    for i, (name, unit) in enumerate(res3_curve_names(n_curves)):
+        blocks.append((PcRes3.SensData_id, name, 'sensor', (i, name, unit)))
+    fraction_volumes = np.linspace(0.0, total_volume, n_fractions + 1)[1:]
+    blocks.append((PcRes3.Fractions_id, 'Fractions', 'meta1',
+                   _meta1_block(fraction_volumes, [str(i + 1) for i in range(n_fractions - 1)] + ['Waste'])))
+    injection_volumes = np.round(np.array([0.0] + list(injections)) * total_volume, 2)
+    blocks.append((PcRes3.Inject_id, 'Inject', 'meta1', _meta1_block(injection_volumes, [''] * len(injection_volumes))))
+
+    sizes = [(_block_meta_size if kind != 'meta2' else 0) + (n_points * 8 if kind == 'sensor' else len(data))
+             for _, _, kind, data in blocks]
+    data_start = PcRes3._header_size + PcRes3._declaration_size * (len(blocks) + 1)
+    file_size = data_start + sum(sizes)
+
+    header = bytearray(PcRes3._header_size)
+    header[0:16] = PcRes3.RES_magic_id
+    header[16:20] = struct.pack('<i', file_size)
+    header[24:36] = b'UNICORN 3.10'
+    user = user.encode('iso8859-1')[:40]
+    header[118:118 + len(user)] = user
+    declarations = []
+    address = data_start
+    for (magic_id, name, kind, _), size in zip(blocks, sizes):
+        off_data = 0 if kind == 'meta2' else _block_meta_size
+        label = f"{run_name}:1_{name}".encode('iso8859-1')
+        declarations.append(struct.pack(PcRes3._declaration_format, magic_id, label, size, size, address, off_data))
+        address += size
+    declarations.append(struct.pack(PcRes3._declaration_format, PcRes3.LogBook_id, b'LogBook', 0, 0, address, 0))
+
+    with open(file_name, 'wb') as f:
+        f.write(header)
+        f.write(b''.join(declarations))
+        for _, _, kind, data in blocks:
+            if kind == 'meta2':
+                f.write(data)
+                continue
+            meta = bytearray(_block_meta_size)
+            meta[0:8] = _sensor_marker if kind == 'sensor' else _meta1_marker
+            if kind == 'sensor':
+                i, name, unit = data
+                meta[207:222] = unit.encode('iso8859-1')[:15].ljust(15, b'\x00')
+                f.write(meta)
+                f.write(_sensor_block(n_points, i, name, seed))
+            else:
+                f.write(meta)
+                f.write(data)
+    return file_name
+
+
+def _sensor_block(n_points, curve, name, seed):
+    """
+    Sensor data as read by PcRes3.sensor_read(): volume in 0.01 ml and the value scaled by its divisor
+    """
+    pairs = np.empty(n_points, dtype=PcRes3._sensor_dtype)
+    pairs['volume'] = np.arange(n_points)
+    pairs['value'] = np.round(curve_signal(n_points, curve, seed) * PcRes3.sensor_divisor(name))
+    return pairs.tobytes()
+
+
+def _meta1_block(volumes, labels):
+    """
+    Annotation records (acc. time, acc. volume, label) of a meta-data/type1 block
+    """
+    block = bytearray(len(volumes) * PcRes3._meta1_stride)
+    records = np.ndarray((len(volumes),), dtype=PcRes3._meta1_dtype, buffer=block, strides=(PcRes3._meta1_stride,))
+    records['acc_volume'] = volumes
+    records['acc_time'] = volumes  # at 1 ml/min
+    records['label'] = [label.encode('iso8859-1') for label in labels]
+    return bytes(block)
+
+
+def write_uni6(file_name, n_points=10000, n_curves=4, chromatograms=('Chrom.1',), n_fractions=10, injection=0.25,
+               column_volume=1.0, compresslevel=1, seed=0):
+    """
+    Write a synthetic UNICORN 6+ zip-bundle: Chrom.#.Xml, one nested Chrom.#_#_True zip per curve
+    (padded with null-bytes like the real ones), Result.xml and Manifest.xml
+
+    Parameters
+    ----------
+    file_name : str or Path
+    n_points : int, optional, points per curve, 0.01 ml apart
+    n_curves : int, optional, number of curves per chromatogram, see uni6_curve_names()
+    chromatograms : list of str, optional, names of the chromatograms
+    n_fractions : int, optional, fractions evenly spread over the run, the last one is "Waste"
+    injection : float, optional, injection mark as fraction of the run volume
+    column_volume : float, optional, in ml
+    compresslevel : int, optional, deflate level of the bundle and of the nested zips
+    seed : int, optional
+
+    Returns
+    -------
+    file_name
+    """
+    total_volume = n_points / 100.0
+    volumes = _binary_array(np.arange(n_points) / 100.0)
+    members = []
+    with ZipFile(file_name, 'w', ZIP_DEFLATED, compresslevel=compresslevel) as bundle:
+        bundle.writestr('Result.xml', '<Result><Name>synthetic</Name><Created>2024-01-01T12:00:00.000</Created>'
+                                      '</Result>')
+        members.append('Result.xml')
+        for c, chromatogram in enumerate(chromatograms):
+            curves = []
+            for i, (name, data_type, unit) in enumerate(uni6_curve_names(n_curves)):
+                data_file = f"{chromatogram}_{i + 1}_True"
+                amplitudes = _binary_array(curve_signal(n_points, i, seed + c))
+                bundle.writestr(data_file, _curve_zip(volumes, amplitudes, compresslevel))
+                members.append(data_file)
+                curves.append((name, data_type, unit, data_file))
+            fraction_volumes = np.linspace(0.0, total_volume, n_fractions + 1)[1:]
+            fraction_labels = [str(i + 1) for i in range(n_fractions - 1)] + ['Waste']
+            events = [('Fraction', 'Fraction', fraction_volumes, fraction_labels),
+                      ('Injection', 'Injection', [injection * total_volume], ['']),
+                      ('Logbook', 'Run Log', [0.0, total_volume], ['Method Run', 'End of method'])]
+            bundle.writestr(chromatogram + '.Xml', _chromatogram_xml(chromatogram, c + 1, curves, events,
+                                                                     column_volume))
+            members.append(chromatogram + '.Xml')
+        bundle.writestr('Manifest.xml', '<ExportManifest>' + ''.join(
+            f"<Details><FileName>{escape(member)}</FileName></Details>" for member in members) + '</ExportManifest>')
+    return file_name
+
+
+def _binary_array(values):
+    """
+    A float32 array serialized like UNICORN does (System.Single[] in .NET BinaryFormatter format)
+    """
+    values = np.asarray(values, dtype='<f4')
+    return _array_header + struct.pack('<iB', len(values), 11) + values.tobytes() + b'\x0b'
+
+
+def _curve_zip(volumes, amplitudes, compresslevel):
+    """
+    Nested zip of a curve, zip64 headers and null-byte padding as in files written by UNICORN
+    """
+    out = io.BytesIO()
+    with ZipFile(out, 'w', ZIP_DEFLATED, compresslevel=compresslevel) as curve_zip:
+        for name, data in [('CoordinateData.AmplitudesDataType', b'System.Single[]\r\n'),
+                           ('CoordinateData.Amplitudes', amplitudes),
+                           ('CoordinateData.VolumesDataType', b'System.Single[]\r\n'),
+                           ('CoordinateData.Volumes', volumes)]:
+            with curve_zip.open(name, 'w', force_zip64=True) as f:
+                f.write(data)
+    size = out.tell()
+    out.write(bytes(-size % 4096))
+    return out.getvalue()
+
+
+def _chromatogram_xml(chromatogram, chrom_id, curves, events, column_volume):
+    """
+    Chrom.#.Xml with the elements PcUni6 reads, in the order UNICORN writes them
+    """
+    parts = [f"<Chromatogram><ChromatogramName>{escape(chromatogram)}</ChromatogramName>"
+             f"<ChromatogramID>{chrom_id}</ChromatogramID><Curves>"]
+    for number, (name, data_type, unit, data_file) in enumerate(curves, 1):
+        parts.append(f'<Curve CurveDataType="{data_type}"><Name>{escape(name)}</Name>'
+                     f'<AmplitudeUnit>{escape(unit)}</AmplitudeUnit><IsOriginalData>true</IsOriginalData>'
+                     f'<CurveNumber>{number}</CurveNumber><ColumnVolume>{column_volume}</ColumnVolume>'
+                     f'<CurvePoints><CurvePoint><IsFullResolution>true</IsFullResolution>'
+                     f'<BinaryCurvePointsFileName>{escape(data_file)}</BinaryCurvePointsFileName>'
+                     f'</CurvePoint></CurvePoints></Curve>')
+    parts.append('</Curves><EventCurves>')
+    for number, (curve_type, name, volumes, labels) in enumerate(events, len(curves) + 1):
+        # ColumnVolume has to be the 11th element, PcUni6 reads it by position
+        parts.append(f'<EventCurve EventCurveType="{curve_type}"><Name>{escape(name)}</Name>'
+                     '<MethodStartTime/><MethodStartTimeUtcOffsetMinutes/><ChromatogramStartTime/>'
+                     '<ChromatogramStartTimeUtcOffsetMinutes/><InjectionEventCurve/><TimeUnit>min</TimeUnit>'
+                     '<VolumeUnit>ml</VolumeUnit><IsOriginalData>true</IsOriginalData>'
+                     f'<CurveNumber>{number}</CurveNumber><ColumnVolume>{column_volume}</ColumnVolume>'
+                     '<ColumnVolumeUnitName>ml</ColumnVolumeUnitName><Events>')
+        parts.extend(f'<Event EventType="{curve_type}"><EventTime>{volume}</EventTime>'
+                     f'<EventVolume>{volume}</EventVolume><EventText>{escape(label)}</EventText></Event>'
+                     for volume, label in zip(volumes, labels))
+        parts.append('</Events></EventCurve>')
+    parts.append('</EventCurves></Chromatogram>')
+    return ''.join(parts).encode('utf-8')
@@ -1,35 +1,166 @@
+from __future__ import annotations
+
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 
 from pycorn import PcUni6
 
 
-def get_series_from_data_dict(data_dictionary, target_key, data_key_list):
+_methods = ('linear', 'nearest', 'previous', 'bin-mean')
+
+
+def prepare_curve(volumes, values, offset=0.0):
+    """
+    Clean up the points of a curve for resampling: points without a value are dropped, of points
+    with the same volume only the first one is kept, the points are sorted by volume
+    and `offset` (e.g. the injection volume) is subtracted from the volumes.
+
+    Returns
+    -------
+    volumes, values : float arrays
+    """
+    volumes = np.asarray(volumes, dtype=float)
+    values = np.asarray(values, dtype=float)
+    n_points = min(len(volumes), len(values))
+    volumes, values = volumes[:n_points], values[:n_points]
+    valid = ~np.isnan(values)
+    if not valid.all():
+        volumes, values = volumes[valid], values[valid]
+    # np.unique sorts and returns the index of the first occurrence of every volume
+    volumes, first = np.unique(volumes, return_index=True)
+    return volumes - offset, values[first]
+
+
+def resample(volumes, values, grid, method='linear', left=None, right=None):
+    """
+    Values of a curve at the volumes in `grid`
+
+    Parameters
+    ----------
+    volumes, values : arrays, points of the curve, volumes sorted and unique (see prepare_curve)
+    grid : array, volumes to resample at
+    method : str, optional
+        'linear' : linear interpolation between the neighbouring points (default)
+        'nearest' : value of the closest point
+        'previous' : value of the last point at or before the grid volume
+        'bin-mean' : mean of all points closer to the grid volume than to its neighbours in the (sorted) grid,
+            NaN if there is no such point
+    left, right : float, optional, value before the first/after the last point of the curve.
+        Default: the value of the first/last point (for 'previous' NaN before the first point)
+
+    Returns
+    -------
+    values : float array of the same shape as grid
+    """
+    grid = np.asarray(grid, dtype=float)
+    if len(volumes) == 0:
+        return np.full(grid.shape, np.nan)
+    if method == 'linear':
+        return np.interp(grid, volumes, values, left=left, right=right)
+    if method == 'bin-mean':
+        return _bin_mean(volumes, values, grid)
+    if method == 'nearest':
+        i = np.clip(np.searchsorted(volumes, grid), 1, len(volumes) - 1)
+        if len(volumes) > 1:
+            i -= grid - volumes[i - 1] <= volumes[i] - grid
+        else:
+            i[:] = 0
+        result = values[i]
+    elif method == 'previous':
+        i = np.searchsorted(volumes, grid, side='right') - 1
+        result = values[np.maximum(i, 0)]
+        result[i < 0] = np.nan
+    else:
+        raise ValueError(f"unknown resampling method {method}, use one of {_methods}")
+    if left is not None:
+        result[grid < volumes[0]] = left
+    if right is not None:
+        result[grid > volumes[-1]] = right
+    return result
+
+
+def _bin_mean(volumes, values, grid):
+    """
+    Mean of the points in the bins around each grid volume, the bins end halfway to the neighbouring volumes
+    """
+    if len(grid) == 1:
+        return np.array([values.mean()])
+    edges = np.empty(len(grid) + 1)
+    edges[1:-1] = (grid[1:] + grid[:-1]) / 2
+    edges[0] = grid[0] - (grid[1] - grid[0]) / 2
+    edges[-1] = grid[-1] + (grid[-1] - grid[-2]) / 2
+    bins = np.searchsorted(edges, volumes, side='right') - 1
+    inside = (bins >= 0) & (bins < len(grid))
+    sums = np.bincount(bins[inside], weights=values[inside], minlength=len(grid))
+    counts = np.bincount(bins[inside], minlength=len(grid))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def resample_curves(curves, grid, method='linear', offsets=0.0, out=None):
+    """
+    Resample many curves, e.g. of several runs, onto one grid
+
+    Parameters
+    ----------
+    curves : list of Curve or of (volumes, values) tuples
+    grid : array, volumes to resample at
+    method : str, optional, see resample()
+    offsets : float or list of floats, optional, volume(s) subtracted from the curves (e.g. the injection volume)
+    out : array of shape (len(curves), len(grid)), optional, the result is written into it
+
+    Returns
+    -------
+    values : float array of shape (len(curves), len(grid))
+    """
+    grid = np.asarray(grid, dtype=float)
+    offsets = np.broadcast_to(np.asarray(offsets, dtype=float), (len(curves),))
+    if out is None:
+        out = np.empty((len(curves), len(grid)))
+    for i, (curve, offset) in enumerate(zip(curves, offsets)):
+        volumes, values = (curve.volumes, curve.values) if hasattr(curve, 'volumes') else curve
+        out[i] = resample(*prepare_curve(volumes, values, offset), grid, method=method)
+    return out
+
+
+def injection_volume(chromatogram):
+    """
+    Volume of the injection used as zero volume, 0 if the chromatogram has no injection mark
+    """
     try:
         # select the first injection as the injection timestamp
-        inject_timestamp = data_dictionary[target_key]["Injection"]["data"][-1][0]
-    except KeyError:
-        inject_timestamp = 0
+        return chromatogram["Injection"].volumes[-1]
+    except (KeyError, IndexError):
+        return 0
 
-    data_series_list = []
-    for data_key in data_key_list:
-        data_array = np.array(data_dictionary[target_key][data_key]["data"]).astype(float)
-        data_series = pd.Series(data=data_array[:, 1], index=data_array[:, 0])
-        # remove duplicates
-        data_series = data_series[~data_series.index.duplicated()]
-        # offset by the infection_timestamp
-        data_series.index -= inject_timestamp
 
-        data_series_list.append(data_series)
+def get_series_from_data_dict(data_dictionary, target_key, data_key_list, index=None, method='linear'):
+    """
+    The curves `data_key_list` of chromatogram `target_key` as one DataFrame, with the volumes
+    relative to the injection as index.
 
+    Without `index`, the index is the union of all points and a curve is NaN at the points of the others.
+    With `index`, all curves are resampled onto it with `method` (see resample()).
+    """
+    import pandas as pd
+    chromatogram = data_dictionary[target_key]
+    inject_timestamp = injection_volume(chromatogram)
+    curves = [chromatogram[data_key] for data_key in data_key_list]
+    if index is not None:
+        values = resample_curves(curves, index, method=method, offsets=inject_timestamp)
+        return pd.DataFrame(values.T, index=index, columns=data_key_list)
+
+    data_series_list = [pd.Series(data=values, index=volumes)
+                        for volumes, values in (prepare_curve(curve.volumes, curve.values, inject_timestamp)
+                                                for curve in curves)]
     df = pd.concat(data_series_list, axis=1)
     df.columns = data_key_list
     return df
 
 
-def import_xml_as_df(file_path: (str | Path), data_key_list: list = None, index: np.ndarray = None) -> pd.DataFrame:
+def import_xml_as_df(file_path: (str | Path), data_key_list: list = None, index: np.ndarray = None,
+                     method: str = 'linear') -> pd.DataFrame:
     """
     Import the contents of a Unicorn Res/zip file into a pd.Dataframe
 
@@ -39,57 +170,78 @@ def import_xml_as_df(file_path: (str | Path), data_key_list: list = None, index:
     data_key_list: list, optional, Keys to include in the DataFrame. Default: ["Cond", "UV", "Conc B"]
     index: np.ndarray, optional, Array of shape (1, ), to be used as index in the returned pd.DataFrame.
         Units are the same as the original data.
+    method: str, optional, how the curves are resampled onto the index, see resample(). Default: 'linear'
 
     Returns
     -------
     dataframe : pd.DataFrame
 
     """
+    import pandas as pd
     if data_key_list is None:
         data_key_list = ["Cond", "UV", "Conc B"]
 
-    data_dictionary = PcUni6(file_path)
-    data_dictionary.load_all_xml()
+    data_dictionary = PcUni6(file_path, lazy=True)
+    data_dictionary.load()
+    # look up the curve names of all chromatograms, without decoding any curve data
+    curve_names = {key.replace(".Xml", ""): list(data_dictionary.curve_index(key))
+                   for key in data_dictionary.chromatogram_keys()}
 
-    target_key_list = [
-        key for key in data_dictionary
-        if "events" not in key
-           and "Cond" in key
-           and any(s.lower() in key.lower() for s in ["Tracer", "Injection", "Chrom", "Breakthrough", "Elution"])
-           and any(["UV" in sub_key for sub_key in data_dictionary[key]])
-    ]
-
-    if any("breakthrough" in key.lower() for key in target_key_list):
-        target_key_list = [key for key in target_key_list if "breakthrough" in key.lower()]
+    target_key_list = _target_chromatograms(curve_names)
 
     if len(target_key_list) == 0:
+        data_dictionary.close()
         return None
 
-    if "UV" not in data_dictionary[target_key_list[0]]:
+    if "UV" not in curve_names[target_key_list[0]]:
         data_key_list.remove("UV")
-        data_key_list.extend([sub_key for sub_key in data_dictionary[target_key_list[0]] if
+        data_key_list.extend([sub_key for sub_key in curve_names[target_key_list[0]] if
                               ("UV" in sub_key and not "cell path" in sub_key)])
 
-    series_list = [get_series_from_data_dict(data_dictionary, chrom, data_key_list) for chrom in target_key_list]
+    data_dictionary.load_curves(curves=data_key_list, chromatograms=target_key_list)
+    data_dictionary.close()
+
+    # duplicate removal and injection offset are applied once per curve
+    prepared = {target_key: [prepare_curve(curve.volumes, curve.values, injection_volume(chromatogram))
+                             for curve in (chromatogram[data_key] for data_key in data_key_list)]
+                for target_key, chromatogram in ((key, data_dictionary[key]) for key in target_key_list)}
+    first_volumes = [volumes for volumes, _ in prepared[target_key_list[0]] if len(volumes)]
+    volume_min = min(volumes[0] for volumes in first_volumes)
+    volume_max = max(volumes[-1] for volumes in first_volumes)
 
     if index is None:
-        index = np.linspace(series_list[0].index.min(), series_list[0].index.max(), 100).round(3)
+        index = np.linspace(volume_min, volume_max, 100).round(3)
 
     # align and unify the index
-    index = index[index < series_list[0].index.max()]
+    index = index[index < volume_max]
 
     if len(data_key_list) > 1:
         column_names = [(target_key, data_key) for target_key in target_key_list for data_key in data_key_list]
-        column_names += [("temporary_insert", 0)]
     else:
         column_names = target_key_list
-        column_names += ["temporary_insert"]
 
-    # combine datapoints into one DataFrame and interpolate onto the unified index
-    series_list.append(pd.Series(data=np.NaN, index=index))
-    dataframe = pd.concat(series_list, axis=1, join="outer")
-    dataframe.columns = column_names
-    dataframe = dataframe.interpolate("index", )
-    dataframe = dataframe.loc[index, column_names[:-1]]
+    curves = [curve for target_key in target_key_list for curve in prepared[target_key]]
+    values = np.empty((len(index), len(curves)))
+    for i, (volumes, curve_values) in enumerate(curves):
+        values[:, i] = resample(volumes, curve_values, index, method=method)
+    dataframe = pd.DataFrame(values, index=index, columns=column_names)
 
     return dataframe
+
+
+def _target_chromatograms(curve_names):
+    """
+    Chromatograms to import: Tracer/Injection/Chrom/Breakthrough/Elution runs with a conductivity and UV curve,
+    only the breakthrough runs if there are any.
+    """
+    target_key_list = [
+        key for key in curve_names
+        if "events" not in key
+           and "Cond" in key
+           and any(s.lower() in key.lower() for s in ["Tracer", "Injection", "Chrom", "Breakthrough", "Elution"])
+           and any(["UV" in sub_key for sub_key in curve_names[key]])
+    ]
+
+    if any("breakthrough" in key.lower() for key in target_key_list):
+        target_key_list = [key for key in target_key_list if "breakthrough" in key.lower()]
+    return target_key_list
@@ -1,19 +1,17 @@
 #!/usr/bin/env python
-try:
-    from setuptools import setup
-except ImportError:
-    print("setuptools not found, falling back to distutils")
-    from distutils.core import setup
+# the pycorn-bin command and the dependencies are declared with setuptools features that distutils ignores
+from setuptools import setup
 
 setup(
     name='pycorn',
     version='0.20',
     author='R. Jaepel',
     packages=['pycorn'],
-    requires=["xmltodict"],
-    extras_require={'plotting':  ["matplotlib"], 'xlsx-output': ['xlsxwriter'], "processing": ["numpy", "pandas"],
+    install_requires=["xmltodict", "numpy"],
+    extras_require={'plotting':  ["matplotlib"], 'xlsx-output': ['xlsxwriter'], 'parquet-output': ['pyarrow'],
+                    "processing": ["pandas"],
                     "testing": ["pytest"]},
-    scripts=['examplescripts/pycorn-bin.py'],
+    entry_points={'console_scripts': ['pycorn-bin = pycorn.cli:main']},
     platforms=['Linux', 'Windows', 'MacOSX'],
     zip_safe=False,
     classifiers=["License :: OSI Approved :: GNU General Public License v2 (GPLv2)",
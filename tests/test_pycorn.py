@@ -1,12 +1,16 @@
+import os
+
 import numpy as np
 import pytest
 
-from pycorn import PcUni6
+from pycorn import Curve, EventList, PcUni6, RunCache, load_many
 from pycorn.utils import import_xml_as_df
 
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "samples", "sample.zip")
+
 
 def test_import_utility():
-    file_path = r"..\samples\sample.zip"
+    file_path = SAMPLE
     reference_data = np.array([[1.72348633e+01, 9.91999893e+01, -1.64260855e-03, 9.71418340e-03, 0.00000000e+00],
                                [1.69039273e+01, 9.91999893e+01, 7.54344136e-01, 8.22319886e-01, 0.00000000e+00],
                                [1.70131853e+01, 9.91999893e+01, 1.12997290e-02, 2.78141668e-02, 0.00000000e+00],
@@ -19,7 +23,7 @@ def test_import_utility():
 
 
 def test_pcuni6_interface():
-    file_path = r"..\samples\sample.zip"
+    file_path = SAMPLE
     reference_data = [(0.0, -0.0016426085494458675),
                       (0.0, -0.0016426085494458675),
                       (0.0, -0.0016426085494458675),
@@ -44,4 +48,578 @@ def test_pcuni6_interface():
     xml_data.load()
     assert reference_keys == list(xml_data.keys())
     xml_data.load_all_xml()
-    assert reference_data == xml_data["Chrom.1"]["UV 1_280"]["data"][:10]
+    np.testing.assert_array_equal(xml_data["Chrom.1"]["UV 1_280"]["data"][:10], reference_data)
+    assert xml_data["Chrom.1"]["UV 1_280"]["data"].dtype == np.float32
+
+
+def test_pcuni6_tuple_output():
+    file_path = SAMPLE
+    reference_data = [(0.0, -0.0016426085494458675),
+                      (0.0, -0.0016426085494458675),
+                      (0.0, -0.0016426085494458675)]
+
+    xml_data = PcUni6(file_path, as_tuples=True)
+    xml_data.load_all_xml()
+    assert reference_data == xml_data["Chrom.1"]["UV 1_280"]["data"][:3]
+
+
+def test_pcuni6_lazy_bundle():
+    file_path = SAMPLE
+    eager_data = PcUni6(file_path)
+    eager_data.load()
+
+    with PcUni6(file_path, lazy=True) as lazy_data:
+        lazy_data.load()
+        assert list(eager_data.keys()) == list(lazy_data.keys())
+        assert not any(lazy_data.is_decoded(key) for key in lazy_data)
+        assert lazy_data.date == "2023-03-10"
+
+        volumes = lazy_data["Chrom.1_1_True"]["CoordinateData.Volumes"]
+        np.testing.assert_array_equal(volumes, eager_data["Chrom.1_1_True"]["CoordinateData.Volumes"])
+        assert [key for key in lazy_data if lazy_data.is_decoded(key)] == ["Chrom.1_1_True", "Result.xml"]
+
+        lazy_data.evict("Chrom.1_1_True")
+        assert not lazy_data.is_decoded("Chrom.1_1_True")
+
+
+def test_pcuni6_load_curves():
+    file_path = SAMPLE
+    full_data = PcUni6(file_path)
+    full_data.load_all_xml()
+
+    xml_data = PcUni6(file_path)
+    xml_data.load_curves(curves=["UV 1_280", "Cond"], chromatograms=["Chrom.1"])
+    assert list(xml_data["Chrom.1"].keys()) == ["Fractions", "Injection", "Run Log", "UV 1_280", "Cond"]
+    for curve in ["UV 1_280", "Cond"]:
+        np.testing.assert_array_equal(xml_data["Chrom.1"][curve]["data"], full_data["Chrom.1"][curve]["data"])
+
+
+def test_pcuni6_curve_objects():
+    file_path = SAMPLE
+    xml_data = PcUni6(file_path)
+    xml_data.load_all_xml()
+
+    uv = xml_data["Chrom.1"]["UV 1_280"]
+    assert isinstance(uv, Curve)
+    assert (uv.name, uv.unit, uv.chrom_id, uv.column_vol) == ("UV 1_280", "mAU", "6670", "0.7")
+    assert uv["data_name"] == uv.name and uv["unit"] == uv.unit
+    assert len(uv.volumes) == len(uv.values) == 22580
+    np.testing.assert_array_equal(uv["data"], np.column_stack((uv.volumes, uv.values)))
+
+    fractions = xml_data["Chrom.1"]["Fractions"]
+    assert isinstance(fractions, EventList)
+    assert fractions.labels == ["Frac", "Waste"]
+    assert fractions["data"] == list(zip(fractions.volumes.tolist(), fractions.labels))
+
+
+def test_block_equality(tmp_path):
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    file_path = SAMPLE
+    first, second = PcUni6(file_path), PcUni6(file_path)
+    for xml_data in (first, second):
+        xml_data.load_all_xml()
+    assert first == second
+    assert first["Chrom.1"]["UV 1_280"] == second["Chrom.1"]["UV 1_280"]
+    assert first["Chrom.1"]["Fractions"] == second["Chrom.1"]["Fractions"]
+    # blocks still compare with the plain dicts used before
+    assert first["Chrom.1"]["Fractions"] == dict(second["Chrom.1"]["Fractions"])
+    second["Chrom.1"]["UV 1_280"].values = second["Chrom.1"]["UV 1_280"].values + 1.0
+    assert first["Chrom.1"]["UV 1_280"] != second["Chrom.1"]["UV 1_280"]
+    assert first != second
+    assert first["Chrom.1"]["UV 1_280"] != first["Chrom.1"]["Cond"]
+
+    res_file = write_res3(str(tmp_path / "equal.res"), n_points=500, n_curves=3)
+    res_a, res_b = PcRes3(res_file), PcRes3(res_file, lazy=True)
+    res_a.load()
+    res_b.load()
+    assert res_a == res_b
+    res_b["Fractions"].labels[0] = "changed"
+    assert res_a["Fractions"] != res_b["Fractions"] and res_a != res_b
+
+
+def test_load_many(tmp_path):
+    file_path = SAMPLE
+    broken_path = tmp_path / "broken.res"
+    broken_path.write_bytes(b"not a result file")
+
+    results = list(load_many([file_path, broken_path, file_path], workers=2, curves=["UV 1_280"]))
+    assert [result.path for result in results] == [file_path, broken_path, file_path]
+    assert isinstance(results[1].error, ValueError) and results[1].data is None
+    for result in (results[0], results[2]):
+        assert result.error is None
+        assert list(result.data["Chrom.1"].keys()) == ["Fractions", "Injection", "Run Log", "UV 1_280"]
+
+
+def test_run_cache(tmp_path):
+    file_path = SAMPLE
+    cache = RunCache(tmp_path / "cache")
+    cold_data = cache.load(file_path, curves=["UV 1_280", "Cond"])
+    warm_data = cache.load(file_path, curves=["UV 1_280", "Cond"])
+    assert len(cache.entries()) == 1
+    assert list(warm_data["Chrom.1"].keys()) == list(cold_data["Chrom.1"].keys())
+    np.testing.assert_array_equal(warm_data["Chrom.1"]["UV 1_280"]["data"], cold_data["Chrom.1"]["UV 1_280"]["data"])
+    assert warm_data["Chrom.1"]["Fractions"]["data"] == cold_data["Chrom.1"]["Fractions"]["data"]
+    assert warm_data.date == "2023-03-10"
+
+    cache.max_bytes = 0
+    cache.load(file_path)
+    assert len(cache.entries()) == 1
+
+    # a damaged entry is a miss, it is dropped and stored again
+    arrays_file = tmp_path / "cache" / cache.key(file_path) / "arrays.bin"
+    for damage in (lambda: arrays_file.write_bytes(arrays_file.read_bytes()[:1000]), arrays_file.unlink):
+        damage()
+        assert cache.get(file_path) is None and not cache.entries()
+        reloaded = cache.load(file_path)
+        np.testing.assert_array_equal(reloaded["Chrom.1"]["UV 1_280"]["data"], cold_data["Chrom.1"]["UV 1_280"]["data"])
+        assert arrays_file.exists() and cache.get(file_path) is not None
+
+
+def test_export(tmp_path):
+    from pycorn import export
+
+    file_path = SAMPLE
+    xml_data = PcUni6(file_path)
+    xml_data.load_curves(curves=["UV 1_280"])
+    uv = xml_data["Chrom.1"]["UV 1_280"]
+
+    files = export.write_csv(xml_data, tmp_path / "sample.zip")
+    assert [os.path.basename(file) for file in files] == ["sample_Chrom.1_Fractions.csv", "sample_Chrom.1_Injection.csv",
+                                                         "sample_Chrom.1_Run Log.csv", "sample_Chrom.1_UV 1_280.csv"]
+    np.testing.assert_array_equal(np.loadtxt(files[-1], delimiter=","), uv["data"])
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    export.write_table({"run1": xml_data, "run2": xml_data}, tmp_path / "runs.parquet")
+    table = pq.read_table(tmp_path / "runs.parquet").to_pandas()
+    assert len(table) == 2 * sum(len(block.volumes) for block in xml_data["Chrom.1"].values())
+    uv_rows = table[(table["run"] == "run2") & (table["curve"] == "UV 1_280")]
+    np.testing.assert_array_equal(uv_rows["value"], uv.values)
+    assert list(table.loc[table["curve"] == "Fractions", "label"][:2]) == ["Frac", "Waste"]
+
+
+def test_export_xlsx(tmp_path):
+    from pycorn import export
+
+    pytest.importorskip("xlsxwriter")
+    openpyxl = pytest.importorskip("openpyxl")
+    file_path = SAMPLE
+    xml_data = PcUni6(file_path)
+    xml_data.load_curves(curves=["UV 1_280"])
+    uv_data = xml_data["Chrom.1"]["UV 1_280"]["data"]
+
+    export.write_xlsx({"run1": xml_data, "run2": xml_data}, tmp_path / "runs.xlsx")
+    workbook = openpyxl.load_workbook(tmp_path / "runs.xlsx", read_only=True)
+    assert workbook.sheetnames == ["run1", "run2"]
+    rows = list(workbook["run2"].iter_rows(values_only=True))
+    assert rows[0][:2] == ("Fractions", None) and rows[1][:2] == ("ml", "Fraction")
+    assert rows[0][6:] == ("UV 1_280", None) and rows[1][6:] == ("ml", "mAU")
+    np.testing.assert_allclose(np.array([row[6:] for row in rows[2:]], dtype=float), uv_data, rtol=1e-15)
+    # the loaded data is not modified by the export
+    np.testing.assert_array_equal(xml_data["Chrom.1"]["UV 1_280"]["data"], uv_data)
+
+
+def test_plot_downsampling():
+    from pycorn import plotting
+
+    x = np.linspace(0, 100, 100001)
+    y = np.sin(x)
+    y[12345] = 5.0
+    for method in ["minmax", "lttb"]:
+        x_dat, y_dat = plotting.downsample(x, y, 500, method)
+        assert len(x_dat) <= 1002
+        assert np.all(np.diff(x_dat) > 0)
+        assert y_dat.max() == 5.0 and (x_dat[0], x_dat[-1]) == (x[0], x[-1])
+
+    assert plotting.x_range(x, 10.0, 20.0) == slice(9999, 20002)
+    assert plotting.nearest_index(x, 10.0004) == 10000
+
+
+def test_resample():
+    from pycorn.utils import prepare_curve, resample, resample_curves
+
+    volumes, values = prepare_curve([0.0, 1.0, 1.0, 3.0, 2.0, 4.0], [0.0, 1.0, 5.0, 3.0, np.nan, 8.0], offset=1.0)
+    np.testing.assert_array_equal(volumes, [-1.0, 0.0, 2.0, 3.0])
+    np.testing.assert_array_equal(values, [0.0, 1.0, 3.0, 8.0])
+
+    grid = np.array([-2.0, -0.5, 0.9, 2.0, 5.0])
+    np.testing.assert_array_equal(resample(volumes, values, grid), [0.0, 0.5, 1.9, 3.0, 8.0])
+    np.testing.assert_array_equal(resample(volumes, values, grid, "nearest"), [0.0, 0.0, 1.0, 3.0, 8.0])
+    np.testing.assert_array_equal(resample(volumes, values, grid, "previous"), [np.nan, 0.0, 1.0, 3.0, 8.0])
+    np.testing.assert_array_equal(resample(volumes, values, [-1.0, 1.0, 3.0, 10.0], "bin-mean"), [0.0, 1.0, 5.5, np.nan])
+
+    stacked = resample_curves([(volumes, values), (volumes, 2 * values)], grid, offsets=[0.0, 1.0])
+    np.testing.assert_array_equal(stacked[1], 2 * resample(volumes - 1.0, values, grid))
+
+
+def test_stack_runs(tmp_path):
+    from pycorn import load_file
+    from pycorn.stack import stack_runs
+    from pycorn.utils import injection_volume, resample_curves
+
+    path = SAMPLE
+    missing = str(tmp_path / "missing.zip")
+    stack = stack_runs([path, missing, path], ["UV 1_280", "Cond", "not a curve"], (-10, 40, 50), workers=1,
+                       out=str(tmp_path / "stack.npy"))
+    assert stack.values.shape == (3, 3, 50)
+    assert list(stack.errors) == [1] and np.isnan(stack.values[1]).all()
+    assert stack.units[:2] == ["mAU", "mS/cm"] and np.isnan(stack.values[:, 2]).all()
+
+    chromatogram = load_file(path)["Chrom.1"]
+    expected = resample_curves([chromatogram["UV 1_280"], chromatogram["Cond"]], stack.grid,
+                               offsets=injection_volume(chromatogram))
+    np.testing.assert_array_equal(stack.values[0, :2], expected)
+    np.testing.assert_array_equal(np.load(tmp_path / "stack.npy")[2, :2], expected)
+
+
+def test_synthetic_files(tmp_path):
+    from pycorn import PcRes3
+    from pycorn.synthetic import curve_signal, write_res3, write_uni6
+
+    res_file = write_res3(str(tmp_path / "synthetic.res"), n_points=2000, n_curves=12, injections=(0.25, 0.5))
+    res_data = PcRes3(res_file, inj_sel=1)
+    assert res_data.input_check()
+    res_data.load()
+    assert res_data.inject_vol == 5.0 and len(res_data.curve_names()) == 12
+    np.testing.assert_allclose(res_data["UV1_280nm"].volumes, np.arange(2000) / 100.0 - 5.0, atol=1e-9)
+    np.testing.assert_allclose(res_data["UV1_280nm"].values, curve_signal(2000, 0), atol=5e-4)
+    assert res_data["Fractions"].labels[-1] == "Waste"
+
+    zip_file = write_uni6(str(tmp_path / "synthetic.zip"), n_points=2000, n_curves=12)
+    zip_data = PcUni6(zip_file)
+    zip_data.load()
+    zip_data.load_all_xml()
+    chromatogram = zip_data["Chrom.1"]
+    assert chromatogram["Injection"].volumes[0] == 5.0 and float(chromatogram["Cond"].column_vol) == 1.0
+    # PcUni6 drops the first 5 and last 12 values of each stored array
+    np.testing.assert_allclose(chromatogram["Curve 11"].values, curve_signal(2000, 11)[5:-12], rtol=1e-6)
+
+
+def test_res3_sensor_decode(tmp_path):
+    import struct
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "decode.res"), n_points=2000, n_curves=9, injections=(0.25,))
+    with open(res_file, "rb") as f:
+        raw_data = f.read()
+    header = PcRes3(res_file)
+    header.readheader()
+    header.inject_det()
+    inject_vol = header.injection_points[1]
+    for reduce in (1, 3):
+        data = PcRes3(res_file, inj_sel=1, reduce=reduce)
+        data.load()
+        tuples = PcRes3(res_file, inj_sel=1, reduce=reduce, as_tuples=True)
+        tuples.load()
+        for name in header.curve_names():
+            # per record, as sensor_read() did before it decoded the block as one array
+            dat = header[name]
+            divisor = PcRes3.sensor_divisor(name)
+            expected = [(round(volume / 100.0 - inject_vol, 4), value / divisor)
+                        for volume, value in (struct.unpack_from("ii", raw_data, i)
+                                              for i in range(dat['d_start'], dat['d_end'], 8))][::reduce]
+            assert tuples[name]["data"] == expected
+            np.testing.assert_array_equal(data[name]["data"], np.array(expected))
+
+
+def test_res3_mmap(tmp_path):
+    import mmap
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "mmap.res"), n_points=2000, n_curves=4, injections=(0.25,))
+    read = PcRes3(res_file, inj_sel=1)
+    read.load()
+    with PcRes3(res_file, inj_sel=1, use_mmap=True) as mapped:
+        assert isinstance(mapped.raw_data, mmap.mmap)
+        mapped.load()
+    assert mapped.raw_data.closed
+    # the decoded blocks stay usable after the file is released
+    assert mapped == read
+    np.testing.assert_array_equal(mapped["UV1_280nm"]["data"], read["UV1_280nm"]["data"])
+
+
+def test_res3_lazy(tmp_path):
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "lazy.res"), n_points=2000, n_curves=4, injections=(0.25,))
+    eager = PcRes3(res_file, inj_sel=1)
+    eager.load()
+    lazy = PcRes3(res_file, inj_sel=1, lazy=True)
+    lazy.load()
+    assert list(lazy.keys()) == list(eager.keys()) and lazy.inject_vol == eager.inject_vol
+    assert not any(lazy.is_decoded(key) for key in lazy)
+
+    assert lazy["Cond"] == eager["Cond"]
+    assert [key for key in lazy if lazy.is_decoded(key)] == ["Cond"]
+    lazy.evict("Cond")
+    assert not lazy.is_decoded("Cond") and lazy["Cond"] == eager["Cond"]
+    lazy.decode_all()
+    assert all(lazy.is_decoded(key) for key in lazy) and lazy == eager
+
+
+def test_res3_annotations(tmp_path):
+    import struct
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "annotations.res"), n_points=2000, n_curves=2, n_logbook=20,
+                          injections=(0.25,))
+    with open(res_file, "rb") as f:
+        raw_data = f.read()
+    header = PcRes3(res_file)
+    header.readheader()
+    data = PcRes3(res_file, inj_sel=1)
+    data.load()
+    for name in ["Logbook", "Fractions", "Inject"]:
+        dat = header[name]
+        # acc. time, acc. volume, label of every 180 byte record, as meta1_read() unpacked them before
+        records = [struct.unpack_from("dd158s", raw_data, i) for i in range(dat['d_start'], dat['d_end'], 180)]
+        events = data[name]
+        assert events.acc_time.tolist() == [record[0] for record in records]
+        assert events["data"] == [(round(record[1] - data.inject_vol, 4),
+                                   record[2].decode('iso8859-1').rstrip('\x00')) for record in records]
+
+
+def test_load_stats():
+    from pycorn import LoadStats
+
+    records = []
+    stats = LoadStats(callback=lambda stage, record: records.append(stage))
+    data = PcUni6(SAMPLE, stats=stats)
+    data.load()
+    data.load_all_xml()
+    totals = stats.as_dict()
+    assert {"zip_read", "nested_unzip", "unpack", "xml_scan", "xml_parse"} <= set(totals)
+    assert totals["xml_parse"]["points"] == sum(len(curve.values) for curve in data["Chrom.1"].values()
+                                                if isinstance(curve, Curve))
+    assert len(records) == sum(stage["calls"] for stage in totals.values())
+
+    batch_stats = LoadStats()
+    results = list(load_many([SAMPLE] * 2, workers=1, stats=batch_stats))
+    assert results[0].stats.as_dict()["unpack"]["points"] == totals["unpack"]["points"]
+    assert batch_stats.as_dict()["unpack"]["calls"] == 2 * totals["unpack"]["calls"]
+
+
+def test_res_follower(tmp_path):
+    from pycorn import PcRes3, ResFollower
+    from pycorn.synthetic import write_res3
+
+    full_file = write_res3(str(tmp_path / "full.res"), n_points=3000, n_curves=3)
+    with open(full_file, "rb") as f:
+        content = f.read()
+    expected = PcRes3(full_file, inj_sel=0)
+    expected.load()
+
+    growing_file = str(tmp_path / "growing.res")
+    with open(growing_file, "wb") as f:
+        f.write(content[:500])
+    chunks = {}
+    with ResFollower(growing_file) as follower:
+        # cut inside the header, the Logbook, a sensor sample and between blocks
+        for size in [500, 5000, 30003, 60000, len(content)]:
+            with open(growing_file, "r+b") as f:
+                f.write(content[:size])
+            for chunk in follower.poll():
+                chunks.setdefault(chunk.name, []).append(chunk)
+        assert follower.poll() == []
+    assert len(chunks["UV1_280nm"]) > 1 and set(chunks) == set(expected.keys()) - {"Methods"}
+    for name, parts in chunks.items():
+        np.testing.assert_array_equal(np.concatenate([part.volumes for part in parts]), expected[name].volumes)
+        if isinstance(expected[name], Curve):
+            np.testing.assert_array_equal(np.concatenate([part.values for part in parts]), expected[name].values)
+        else:
+            assert sum((part.labels for part in parts), []) == expected[name].labels
+
+
+def test_res_header(tmp_path):
+    from pycorn import PcRes3, ResHeader
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "header.res"), n_points=1000, n_curves=12, user="jdoe")
+    header = ResHeader(res_file)
+    assert header.supported and header.user == "jdoe" and header.run_name == "Manual Run 1"
+    data = PcRes3(res_file)
+    data.readheader()
+    assert list(header.entries) == list(data.keys()) and header.curve_names() == data.curve_names()
+    assert header.by_magic_id[PcRes3.SensData_id] == header.curve_names()
+    assert header.block_type("Fractions") == "annotation"
+
+    with open(res_file, "ab") as f:
+        f.write(b"\x00")
+    assert not ResHeader(res_file).supported
+    assert not ResHeader(SAMPLE).supported
+
+
+def test_inject_det_output(tmp_path, capsys):
+    from pycorn import PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "points.res"), n_points=1000, n_curves=2, injections=(0.3,))
+    expected = " Reading: Inject\n ---- \n Injection points: \n # \t ml\n 0 \t 0.0\n 1 \t 3.0\n"
+    for options in [{}, {"lazy": True}, {"lazy": True, "use_mmap": True}]:
+        with PcRes3(res_file, **options) as data:
+            data.readheader()
+            data.inject_det(show=True)
+        assert capsys.readouterr().out == expected
+    # an Inject block decoded by a lazy load before the points are determined
+    data = PcRes3(res_file, lazy=True)
+    data.load()
+    data["Inject"]
+    data.injection_points = None
+    data.inject_det(show=True)
+    assert capsys.readouterr().out == expected and data.injection_points == [0.0, 3.0]
+
+
+def test_select_injection(tmp_path):
+    from pycorn import PcRes3, RunCache
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "injections.res"), n_points=2000, n_curves=3, injections=(0.25, 0.5))
+    data = PcRes3(res_file, inj_sel=0)
+    data.load()
+    raw_volumes = data["UV1_280nm"].raw_volumes
+    for inj_sel in [1, 2, 0, -1]:
+        data.select_injection(inj_sel)
+        expected = PcRes3(res_file, inj_sel=inj_sel)
+        expected.load()
+        assert data.inject_vol == expected.inject_vol
+        for name in ["UV1_280nm", "Cond", "Fractions", "Logbook"]:
+            np.testing.assert_array_equal(data[name].volumes, expected[name].volumes)
+        assert data["UV1_280nm"].raw_volumes is raw_volumes
+
+    lazy = PcRes3(res_file, inj_sel=0, lazy=True)
+    lazy.load()
+    lazy.select_injection(1)
+    cache = RunCache(str(tmp_path / "cache"))
+    cache.load(res_file, inj_sel=1)
+    cached = cache.load(res_file, inj_sel=1)
+    for name in ["UV1_280nm", "Fractions"]:
+        np.testing.assert_array_equal(lazy[name].volumes, cached[name].volumes)
+        assert lazy[name].volume_offset == cached[name].volume_offset == data.injection_points[1]
+
+
+def test_async_loader(tmp_path):
+    import asyncio
+    from pycorn import AsyncLoader, Curve, EventList, PcRes3
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "async.res"), n_points=2000, n_curves=3)
+    expected = PcRes3(res_file)
+    expected.load()
+
+    async def main():
+        loader = AsyncLoader(max_concurrent=2)
+        first, second, other = await asyncio.gather(loader.load(SAMPLE),
+                                                    loader.load(SAMPLE),
+                                                    loader.load(SAMPLE, chromatograms=["Chrom.1"]))
+        assert first is second and other is not first and not loader._loads
+
+        blocks = [block async for block in loader.iter_blocks(res_file)]
+        assert [block.name for block in blocks] == [name for name, block in expected.items()
+                                                    if isinstance(block, (Curve, EventList))]
+        for block in blocks:
+            np.testing.assert_array_equal(block.volumes, expected[block.name].volumes)
+        uv = [block async for block in loader.iter_blocks(SAMPLE, curves=["UV 1_280"])]
+        assert [block.name for block in uv if isinstance(block, Curve)] == ["UV 1_280"]
+
+        # a file holds its slot from the first to the last block
+        single = AsyncLoader(max_concurrent=1)
+        first_file, second_file = single.iter_blocks(res_file), single.iter_blocks(res_file)
+        await first_file.__anext__()
+        waiting = asyncio.ensure_future(second_file.__anext__())
+        done, _ = await asyncio.wait([waiting], timeout=0.2)
+        assert not done
+        await first_file.aclose()
+        assert (await waiting).name == blocks[0].name
+        await second_file.aclose()
+
+        task = asyncio.ensure_future(loader.load(res_file))
+        await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert task.cancelled() and not loader._loads
+
+    asyncio.run(main())
+
+
+def test_cli(tmp_path, capsys):
+    from pycorn.cli import main
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "cli.res"), n_points=1000, n_curves=3, user="jdoe")
+    bad_file = tmp_path / "bad.res"
+    bad_file.write_bytes(b"\x00" * 1000)
+    assert main(["-c", "-u", res_file, SAMPLE]) == 0
+    output = capsys.readouterr().out
+    assert "User: jdoe" in output and f"OK    {res_file}" in output and "2 of 2 files" in output
+
+    assert main(["-c", "--jobs", "2", res_file, str(bad_file)]) == 1
+    assert f"FAIL  {bad_file}" in capsys.readouterr().out
+
+    assert main(["-e", "csv", res_file]) == 0
+    assert (tmp_path / "cli_Manual Run 1_UV1_280nm.csv").exists()
+
+
+def test_cli_xlsx(tmp_path):
+    from pycorn.cli import main
+    from pycorn.synthetic import write_res3, write_uni6
+
+    pytest.importorskip("xlsxwriter")
+    openpyxl = pytest.importorskip("openpyxl")
+    res_file = write_res3(str(tmp_path / "cli.res"), n_points=1000, n_curves=3)
+    zip_file = write_uni6(str(tmp_path / "cli.zip"), n_points=1000, n_curves=2, chromatograms=("Chrom.1", "Chrom.2"))
+    assert main(["-e", "xlsx", res_file, zip_file]) == 0
+    assert openpyxl.load_workbook(tmp_path / "cli_Manual Run 1.xlsx", read_only=True).sheetnames == ["Manual Run 1"]
+    workbook = openpyxl.load_workbook(tmp_path / "cli.xlsx", read_only=True)
+    assert workbook.sheetnames == ["Chrom.1", "Chrom.2"]
+    # the columns of a sheet carry the curve names without the chromatogram
+    assert next(workbook["Chrom.2"].iter_rows(max_row=1, values_only=True))[0] == "Fractions"
+
+
+def test_lightweight_import(tmp_path):
+    import subprocess
+    import sys
+    from pycorn.synthetic import write_res3
+
+    res_file = write_res3(str(tmp_path / "import.res"), n_points=100)
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ("import sys, pycorn, pycorn.cli; pycorn.PcRes3(sys.argv[1]); pycorn.PcUni6(sys.argv[2]); "
+            "print(sorted({'numpy', 'pandas', 'xmltodict', 'matplotlib'} & set(sys.modules)))")
+    output = subprocess.run([sys.executable, "-c", code, res_file, SAMPLE], check=True,
+                            capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=package_dir)).stdout
+    assert output.strip() == "[]"
+
+
+def test_peak_table():
+    from pycorn.peaks import event_windows, peak_table, peak_tables, run_peak_table
+
+    volumes = np.linspace(0, 100, 20001)
+    peaks = [(30.0, 1.0, 100.0), (34.0, 1.0, 50.0), (60.0, 2.0, 80.0)]
+    values = 5 + 0.02 * volumes + sum(h * np.exp(-0.5 * ((volumes - c) / s) ** 2) for c, s, h in peaks)
+    table = peak_table((volumes, values))
+    assert len(table) == 3
+    np.testing.assert_allclose(table["volume"], [c for c, _, _ in peaks], atol=0.01)
+    np.testing.assert_allclose(table["height"], [h for _, _, h in peaks], rtol=1e-3)
+    np.testing.assert_allclose(table["width"][2], 2 * np.sqrt(2 * np.log(2)) * 2.0, rtol=1e-3)
+    # integrated down to 1% of the height, about +-3 sigma
+    np.testing.assert_allclose(table["area"][2], 80.0 * 2.0 * np.sqrt(2 * np.pi), rtol=5e-3)
+    assert np.isnan(table["resolution"][0]) and 0.9 < table["resolution"][1] < 1.1
+
+    windowed = peak_table((volumes, values), windows=event_windows([0.0, 32.0, 50.0]))
+    assert list(windowed["window"]) == [0, 1, 2] and windowed["end"][0] == 32.0
+
+    data = PcUni6(SAMPLE)
+    data.load_all_xml()
+    fractions = run_peak_table(data, "UV 1_280", windows="Fractions", min_prominence=0.05)
+    assert len(fractions) and (fractions["window"] >= 0).all()
+    results = list(peak_tables([SAMPLE, "missing.zip"], "UV 1_280", workers=0,
+                               peak_options=dict(min_prominence=0.05)))
+    assert len(results[0].data) == len(run_peak_table(data, "UV 1_280", min_prominence=0.05))
+    assert results[1].error is not None